@@ -1,4 +1,5 @@
 import argparse
+import sys
 import time
 import cv2
 import numpy as np
@@ -7,21 +8,63 @@ from typing import Dict, Any, Optional, Tuple, List
 from src.hardware_interface.go2 import Go2Robot
 from src.core_modules.visual.grounding_dino.groundingd_dino import GroundingDINO
 from src.core_modules.visual.co_tracker.co_tracker import CoTrackerCamera
+from src.core_modules._jit_kernels import cc_core, bbox_from_points, iou
+
+# 前置摄像头帧率，图像采集周期与之一致，使下面按帧计的检测间隔对应固定的时间
+CAMERA_FPS = 30
+
+# 检测间隔 (帧)：跟踪稳定时每持续STABLE_FRAMES_PER_LEVEL帧翻倍，最大不超过上限
+DETECTION_INTERVAL_MIN = 30
+DETECTION_INTERVAL_MAX = 120
+STABLE_FRAMES_PER_LEVEL = 60
+
+# 重新检测时，检测区域为当前目标边界框按此比例扩大后的区域
+DETECTION_ROI_SCALE = 1.5
+
+# 跟踪点标记 (半径2的实心圆) 的像素偏移，由cv2.circle绘制得到，与逐点绘制结果一致
+_POINT_RADIUS = 2
+_POINT_DISK = cv2.circle(np.zeros((2 * _POINT_RADIUS + 1,) * 2, np.uint8),
+                         (_POINT_RADIUS, _POINT_RADIUS), _POINT_RADIUS, 1, -1)
+_disk_y, _disk_x = np.nonzero(_POINT_DISK)
+POINT_OFFSETS_Y = _disk_y.astype(np.int32) - _POINT_RADIUS
+POINT_OFFSETS_X = _disk_x.astype(np.int32) - _POINT_RADIUS
+
+
+def expand_bbox(bbox: List[float], scale: float, width: int, height: int) -> Tuple[int, int, int, int]:
+    """
+    以中心为基准按比例扩大边界框，并限制在图像范围内
+    
+    Args:
+        bbox: 边界框 [x1, y1, x2, y2]
+        scale: 扩大比例
+        width, height: 图像宽高
+        
+    Returns:
+        扩大后的整数边界框 (x1, y1, x2, y2)
+    """
+    x1, y1, x2, y2 = bbox
+    cx, cy = (x1 + x2) / 2, (y1 + y2) / 2
+    half_w, half_h = (x2 - x1) * scale / 2, (y2 - y1) * scale / 2
+    return (max(0, int(cx - half_w)), max(0, int(cy - half_h)),
+            min(width, int(np.ceil(cx + half_w))), min(height, int(np.ceil(cy + half_h))))
+
 
 class Go2VisualTracker:
-    def __init__(self, target_object: str, tracking_speed: float = 0.5) -> None:
+    def __init__(self, target_object: str, tracking_speed: float = 0.5, show_ui: bool = True) -> None:
         """
         初始化Go2视觉跟踪器
         
         Args:
             target_object: 要跟踪的目标物体名称
             tracking_speed: 跟踪速度系数 (0.0-1.0)
+            show_ui: 是否显示可视化窗口，无显示器时关闭可省去全部绘制开销
         """
         self.target_object = target_object
-        self.tracking_speed = max(0.0, min(1.0, tracking_speed))  # 限制在0-1范围内
+        self.tracking_speed = float(max(0.0, min(1.0, tracking_speed)))  # 限制在0-1范围内
+        self.show_ui = show_ui
         
         # 初始化机器人
-        self.robot = Go2Robot()
+        self.robot = Go2Robot(image_period=1.0 / CAMERA_FPS)
         
         # 初始化视觉模型
         self.detector = GroundingDINO()
@@ -32,6 +75,23 @@ class Go2VisualTracker:
         self.target_bbox = None  # [x1, y1, x2, y2]
         self.track_points = None  # 跟踪点
         self.prev_frame = None  # 上一帧图像
+        self.track_ratio = 0.0  # 图像范围内有效跟踪点占比
+        self._frame_size = None  # 图像宽高 (相机分辨率固定，首帧时缓存)
+
+        # 自适应检测间隔
+        self.detection_interval = DETECTION_INTERVAL_MIN
+        self._stable_frames = 0
+
+        # 终端状态行 (内容不变时不重复输出)
+        self._last_status = None
+
+        # 单位网格 (5x5)，初始化跟踪时映射到目标边界框内
+        # 跟踪点全程使用float32连续数组，上传GPU时无需类型转换
+        grid_x, grid_y = np.meshgrid(np.linspace(0, 1, 5), np.linspace(0, 1, 5))
+        self._unit_grid = np.stack([grid_x.ravel(), grid_y.ravel()], axis=1).astype(np.float32)
+
+        # 可视化缓冲 (仅显示UI时使用，避免每帧重新分配内存)
+        self._vis_buf = None
         
         print(f"Go2VisualTracker initialized. Target object: {target_object}")
     
@@ -57,15 +117,38 @@ class Go2VisualTracker:
         if hasattr(self, 'robot'):
             self.robot.shutdown()
         
-        cv2.destroyAllWindows()
+        if self.show_ui:
+            cv2.destroyAllWindows()
         print("Go2VisualTracker shutdown completed.")
     
-    def detect_target(self, frame: np.ndarray) -> Optional[List[float]]:
+    def _get_latest_frame(self, timeout: float) -> Optional[np.ndarray]:
+        """
+        获取最新一帧图像 (机器人采集线程已完成解码)，推理期间到达的旧帧被新帧覆盖，
+        保证控制命令总是基于最新图像
+        
+        Args:
+            timeout: 等待新图像的超时时间 (秒)
+            
+        Returns:
+            最新图像，超时返回None
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not self.robot.wait_for_observation(timeout=remaining):
+                return None
+            
+            frame = self.robot.get_observation()["front_image"]
+            if frame is not None:
+                return frame
+    
+    def detect_target(self, frame: np.ndarray, prior_bbox: Optional[List[float]] = None) -> Optional[List[float]]:
         """
         使用GroundingDINO检测目标物体
         
         Args:
             frame: 输入图像
+            prior_bbox: 已知的目标边界框，提供时只在其扩大后的区域内检测
             
         Returns:
             检测到的目标边界框 [x1, y1, x2, y2] 或 None
@@ -73,15 +156,25 @@ class Go2VisualTracker:
         if frame is None:
             return None
         
+        # 已知目标位置时裁剪出感兴趣区域，减少检测输入像素
+        offset_x, offset_y = 0, 0
+        if prior_bbox is not None:
+            x1, y1, x2, y2 = expand_bbox(prior_bbox, DETECTION_ROI_SCALE, frame.shape[1], frame.shape[0])
+            if x2 > x1 and y2 > y1:
+                frame = frame[y1:y2, x1:x2]
+                offset_x, offset_y = x1, y1
+        
         # 使用GroundingDINO检测目标
         detections = self.detector.detect(frame, text_prompt=self.target_object)
         
         # 如果检测到目标，返回置信度最高的边界框
         if detections and len(detections) > 0:
-            # 获取置信度最高的检测结果
-            best_detection = max(detections, key=lambda x: x['score'])
-            if best_detection['score'] > 0.5:  # 置信度阈值
-                return best_detection['bbox']  # [x1, y1, x2, y2]
+            # 一次性取出全部置信度，argmax获取置信度最高的检测结果
+            scores = np.fromiter((d['score'] for d in detections), dtype=np.float32, count=len(detections))
+            best = int(np.argmax(scores))
+            if scores[best] > 0.5:  # 置信度阈值
+                x1, y1, x2, y2 = detections[best]['bbox']
+                return [x1 + offset_x, y1 + offset_y, x2 + offset_x, y2 + offset_y]
         
         return None
     
@@ -109,18 +202,11 @@ class Go2VisualTracker:
             x2, y2 = min(w-1, x2), min(h-1, y2)
             
             # 在目标区域内生成跟踪点
-            grid_size = 5
-            x_points = np.linspace(x1, x2, grid_size)
-            y_points = np.linspace(y1, y2, grid_size)
-            
-            track_points = []
-            for y in y_points:
-                for x in x_points:
-                    track_points.append([x, y])
+            self.track_points = self._unit_grid * np.array([x2 - x1, y2 - y1], dtype=np.float32) \
+                + np.array([x1, y1], dtype=np.float32)
             
-            # 初始化跟踪器
-            self.track_points = np.array(track_points)
-            self.prev_frame = frame.copy()
+            # 初始化跟踪器 (解码线程每帧输出新数组，且绘制只写入可视化缓冲，直接引用无需拷贝)
+            self.prev_frame = frame
             self.target_bbox = bbox
             self.tracking_active = True
             
@@ -150,27 +236,20 @@ class Go2VisualTracker:
                 self.track_points
             )
             
-            # 更新跟踪点和上一帧
+            # 更新跟踪点和上一帧 (跟踪点统一为float32连续数组，已满足时不拷贝)
+            tracked_points = np.ascontiguousarray(tracked_points, dtype=np.float32)
             self.track_points = tracked_points
-            self.prev_frame = frame.copy()
+            self.prev_frame = frame
             
-            # 计算新的边界框
+            # 计算新的边界框 (过滤掉图像范围外的异常点)
             if len(tracked_points) > 0:
-                x_coords = tracked_points[:, 0]
-                y_coords = tracked_points[:, 1]
+                x_min, y_min, x_max, y_max, n_valid = bbox_from_points(
+                    tracked_points, frame.shape[1], frame.shape[0]
+                )
                 
-                # 过滤掉异常值
-                valid_indices = np.where(
-                    (x_coords >= 0) & (x_coords < frame.shape[1]) &
-                    (y_coords >= 0) & (y_coords < frame.shape[0])
-                )[0]
+                self.track_ratio = n_valid / len(tracked_points)
                 
-                if len(valid_indices) > 0:
-                    x_min = np.min(x_coords[valid_indices])
-                    y_min = np.min(y_coords[valid_indices])
-                    x_max = np.max(x_coords[valid_indices])
-                    y_max = np.max(y_coords[valid_indices])
-                    
+                if n_valid > 0:
                     # 更新目标边界框
                     self.target_bbox = [x_min, y_min, x_max, y_max]
                     return self.target_bbox
@@ -182,65 +261,49 @@ class Go2VisualTracker:
             self.tracking_active = False
             return None
     
-    def calculate_control_commands(self, frame: np.ndarray, bbox: List[float]) -> Tuple[float, float, float]:
+    def update_detection_interval(self, prev_bbox: Optional[List[float]], bbox: Optional[List[float]]) -> None:
         """
-        根据目标位置计算控制命令
+        根据跟踪置信度自适应调整检测间隔：跟踪稳定时逐级翻倍，跟踪变差时减半
+        
+        Args:
+            prev_bbox: 上一帧目标边界框
+            bbox: 当前帧目标边界框
+        """
+        stable = (
+            prev_bbox is not None and bbox is not None and self.track_ratio > 0.8
+            and iou(*map(float, prev_bbox), *map(float, bbox)) > 0.9
+        )
+        
+        if stable:
+            self._stable_frames += 1
+        else:
+            # 降一级 (检测间隔减半)
+            level = self._stable_frames // STABLE_FRAMES_PER_LEVEL
+            self._stable_frames = max(0, level - 1) * STABLE_FRAMES_PER_LEVEL
+        
+        self.detection_interval = min(
+            DETECTION_INTERVAL_MAX,
+            DETECTION_INTERVAL_MIN * 2 ** (self._stable_frames // STABLE_FRAMES_PER_LEVEL)
+        )
+    
+    def calculate_control_commands(self, bbox: List[float]) -> Tuple[float, float, float]:
+        """
+        根据目标位置计算控制命令 (图像尺寸使用首帧缓存的宽高)
         
         Args:
-            frame: 当前帧图像
             bbox: 目标边界框 [x1, y1, x2, y2]
             
         Returns:
             控制命令 (vx, vy, vyaw)
         """
-        if frame is None or bbox is None:
+        if self._frame_size is None or bbox is None:
             return 0.0, 0.0, 0.0
         
-        # 计算目标中心点
         x1, y1, x2, y2 = bbox
-        target_center_x = (x1 + x2) / 2
-        target_center_y = (y1 + y2) / 2
-        
-        # 计算图像中心
-        frame_height, frame_width = frame.shape[:2]
-        frame_center_x = frame_width / 2
-        frame_center_y = frame_height / 2
-        
-        # 计算目标相对于中心的偏移
-        offset_x = target_center_x - frame_center_x
-        offset_y = target_center_y - frame_center_y
-        
-        # 归一化偏移量
-        norm_offset_x = offset_x / (frame_width / 2)
-        norm_offset_y = offset_y / (frame_height / 2)
-        
-        # 计算目标大小占比
-        target_width = x2 - x1
-        target_height = y2 - y1
-        size_ratio = (target_width * target_height) / (frame_width * frame_height)
-        
-        # 计算控制命令
-        # 水平偏移控制旋转
-        vyaw = -norm_offset_x * 0.5 * self.tracking_speed
-        
-        # 前进速度基于目标大小
-        vx = 0.0
-        if size_ratio < 0.1:  # 目标太小，需要靠近
-            vx = 0.3 * self.tracking_speed
-        elif size_ratio > 0.3:  # 目标太大，需要后退
-            vx = -0.2 * self.tracking_speed
-        
-        # 侧向移动基于水平偏移
-        vy = 0.0
-        if abs(norm_offset_x) > 0.3:  # 如果水平偏移较大，使用侧向移动辅助
-            vy = norm_offset_x * 0.2 * self.tracking_speed
-        
-        # 限制命令范围
-        vx = max(-0.5, min(0.5, vx))
-        vy = max(-0.3, min(0.3, vy))
-        vyaw = max(-0.8, min(0.8, vyaw))
-        
-        return vx, vy, vyaw
+        frame_width, frame_height = self._frame_size
+
+        return cc_core(float(x1), float(y1), float(x2), float(y2),
+                       frame_width, frame_height, self.tracking_speed)
     
     def visualize(self, frame: np.ndarray, bbox: Optional[List[float]] = None) -> np.ndarray:
         """
@@ -256,7 +319,10 @@ class Go2VisualTracker:
         if frame is None:
             return np.zeros((480, 640, 3), dtype=np.uint8)
         
-        vis_frame = frame.copy()
+        if self._vis_buf is None or self._vis_buf.shape != frame.shape or self._vis_buf.dtype != frame.dtype:
+            self._vis_buf = np.empty_like(frame)
+        vis_frame = self._vis_buf
+        np.copyto(vis_frame, frame)
         
         # 绘制目标边界框
         if bbox is not None:
@@ -265,12 +331,18 @@ class Go2VisualTracker:
             cv2.putText(vis_frame, self.target_object, (x1, y1 - 10),
                         cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
         
-        # 绘制跟踪点
+        # 绘制跟踪点 (向量化过滤出图像范围内的点)
         if self.tracking_active and self.track_points is not None:
-            for point in self.track_points:
-                x, y = int(point[0]), int(point[1])
-                if 0 <= x < frame.shape[1] and 0 <= y < frame.shape[0]:
-                    cv2.circle(vis_frame, (x, y), 2, (0, 0, 255), -1)
+            h, w = frame.shape[:2]
+            points = self.track_points.astype(np.int32)
+            in_frame = (points[:, 0] >= 0) & (points[:, 0] < w) & (points[:, 1] >= 0) & (points[:, 1] < h)
+            points = points[in_frame]
+            
+            # 一次花式索引写入所有点的圆形标记，代替逐点调用cv2.circle
+            ys = (points[:, 1:2] + POINT_OFFSETS_Y).ravel()
+            xs = (points[:, 0:1] + POINT_OFFSETS_X).ravel()
+            on_image = (xs >= 0) & (xs < w) & (ys >= 0) & (ys < h)
+            vis_frame[ys[on_image], xs[on_image]] = (0, 0, 255)
         
         # 添加状态信息
         status_text = f"Tracking: {'Active' if self.tracking_active else 'Inactive'}"
@@ -279,66 +351,79 @@ class Go2VisualTracker:
         
         return vis_frame
     
+    def _print_status(self, msg: str, persist: bool = False) -> None:
+        """
+        在单行中刷新状态输出，内容未变化时不写终端
+        
+        Args:
+            msg: 状态信息
+            persist: 是否换行保留该条信息 (用于检测到目标、跟踪丢失等事件)
+        """
+        if msg == self._last_status and not persist:
+            return
+        sys.stdout.write("\r\033[K" + msg + ("\n" if persist else ""))
+        sys.stdout.flush()
+        self._last_status = None if persist else msg
+    
     def run(self) -> None:
         """运行视觉跟踪主循环"""
         try:
             self.initialize()
             
-            detection_interval = 30  # 每30帧进行一次检测
-            frame_count = 0
+            frames_since_detection = 0
             
             while True:
-                # 获取机器人观测数据
-                observation = self.robot.get_observation()
-                
-                # 从观测中获取图像
-                if observation["front_image"] is None:
+                # 从解码线程获取最新图像
+                frame = self._get_latest_frame(timeout=1.0)
+                if frame is None:
                     print("No image available")
-                    time.sleep(0.1)
                     continue
                 
-                # 解码Base64图像
-                image_data = np.frombuffer(observation["front_image"], dtype=np.uint8)
-                frame = cv2.imdecode(image_data, cv2.IMREAD_COLOR)
+                if self._frame_size is None:
+                    self._frame_size = (float(frame.shape[1]), float(frame.shape[0]))
                 
                 # 如果没有激活跟踪或者需要重新检测
-                if not self.tracking_active or frame_count % detection_interval == 0:
-                    # 检测目标
-                    bbox = self.detect_target(frame)
+                if not self.tracking_active or frames_since_detection >= self.detection_interval:
+                    # 检测目标 (跟踪中重新检测时只检测目标附近区域)
+                    bbox = self.detect_target(frame, self.target_bbox if self.tracking_active else None)
+                    frames_since_detection = 0
                     
                     if bbox is not None:
                         # 初始化或重新初始化跟踪
                         self.initialize_tracking(frame, bbox)
-                        print(f"Target {self.target_object} detected and tracking initialized")
+                        self._print_status(f"Target {self.target_object} detected and tracking initialized", persist=True)
                 
                 # 更新跟踪
                 if self.tracking_active:
+                    prev_bbox = self.target_bbox
                     bbox = self.update_tracking(frame)
+                    self.update_detection_interval(prev_bbox, bbox)
                     
                     if bbox is not None:
                         # 计算控制命令
-                        vx, vy, vyaw = self.calculate_control_commands(frame, bbox)
+                        vx, vy, vyaw = self.calculate_control_commands(bbox)
                         
                         # 发送控制命令到机器人
                         self.robot.move(vx, vy, vyaw)
                         
-                        print(f"Tracking: vx={vx:.2f}, vy={vy:.2f}, vyaw={vyaw:.2f}")
+                        self._print_status(f"Tracking: vx={vx:.2f}, vy={vy:.2f}, vyaw={vyaw:.2f}")
                     else:
                         # 跟踪失败，停止机器人
                         self.robot.move(0.0, 0.0, 0.0)
                         self.tracking_active = False
-                        print("Tracking lost")
+                        self._print_status("Tracking lost", persist=True)
                 
                 # 可视化
-                vis_frame = self.visualize(frame, self.target_bbox if self.tracking_active else None)
-                cv2.imshow("Go2 Visual Tracking", vis_frame)
-                
-                # 按ESC键退出
-                key = cv2.waitKey(1) & 0xFF
-                if key == 27:  # ESC
-                    break
+                if self.show_ui:
+                    vis_frame = self.visualize(frame, self.target_bbox if self.tracking_active else None)
+                    cv2.imshow("Go2 Visual Tracking", vis_frame)
+                    
+                    # 按ESC键退出
+                    key = cv2.waitKey(1) & 0xFF
+                    if key == 27:  # ESC
+                        break
                 
-                frame_count += 1
+                frames_since_detection += 1
                 
         except KeyboardInterrupt:
             print("Interrupted by user")
@@ -352,9 +437,12 @@ def main():
                         help="Target object to track (default: person)")
     parser.add_argument("--speed", type=float, default=0.5,
                         help="Tracking speed factor (0.0-1.0, default: 0.5)")
+    parser.add_argument("--headless", action="store_true",
+                        help="Run without the visualization window")
     args = parser.parse_args()
     
-    tracker = Go2VisualTracker(target_object=args.target, tracking_speed=args.speed)
+    tracker = Go2VisualTracker(target_object=args.target, tracking_speed=args.speed,
+                               show_ui=not args.headless)
     tracker.run()
 
 if __name__ == "__main__":
@@ -1,20 +1,54 @@
 import cv2
+import glob
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+
+def list_camera_ids():
+    """
+    列出待探测的 camera_id
+
+    Linux下直接枚举 /dev/video* 设备节点，只探测真实存在的设备；
+    其他平台无法枚举，退回探测 0~9
+    """
+    if sys.platform.startswith("linux"):
+        paths = glob.glob("/dev/video*")
+        return sorted(int(m.group(1)) for m in map(re.compile(r"/dev/video(\d+)$").match, paths) if m)
+    return list(range(10))
+
+
+def probe_camera(camera_id):
+    """
+    打开设备并读取分辨率
+
+    Returns:
+        (camera_id, 是否打开成功, 宽, 高)
+    """
+    cap = cv2.VideoCapture(camera_id)
+    opened = cap.isOpened()
+    width = cap.get(cv2.CAP_PROP_FRAME_WIDTH) if opened else 0
+    height = cap.get(cv2.CAP_PROP_FRAME_HEIGHT) if opened else 0
+    # 释放资源
+    cap.release()
+    return camera_id, opened, width, height
+
 
 if __name__ == '__main__':
-    # 尝试不同的 camera_id，直到找不到更多设备
-    for camera_id in range(10):
-        cap = cv2.VideoCapture(camera_id)
-        if not cap.isOpened():
+    camera_ids = list_camera_ids()
+    if not camera_ids:
+        print("未找到视频设备")
+
+    # 打开设备较慢 (每个0.2~2s)，并行探测；VideoCapture在阻塞时会释放GIL
+    with ThreadPoolExecutor(max_workers=max(len(camera_ids), 1)) as executor:
+        results = list(executor.map(probe_camera, camera_ids))
+
+    for camera_id, opened, width, height in results:
+        if not opened:
             print(f"无法打开设备 camera_id={camera_id}")
-            cap.release()
             continue
         print(f"成功打开设备 camera_id={camera_id}")
-        # 获取摄像头的一些属性
-        width = cap.get(cv2.CAP_PROP_FRAME_WIDTH)
-        height = cap.get(cv2.CAP_PROP_FRAME_HEIGHT)
         print(f"设备支持的分辨率: {width}x{height}")
-        # 释放资源
-        cap.release()
 
     cap = cv2.VideoCapture(0)
     # 检查摄像头是否成功打开
@@ -0,0 +1,215 @@
+"""
+Numerical kernels used by the visual tracking app and the GroundingDINO preprocess.
+
+Backends, in order of preference:
+    1. aot:   ahead-of-time compiled extension `kabutack_kernels` (no JIT at startup),
+              build it once with `python -m src.core_modules._jit_kernels`
+    2. jit:   numba.njit with on-disk cache
+    3. numpy: pure NumPy fallback when numba is not installed
+"""
+import os
+import numpy as np
+
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:
+    prange = range
+    NUMBA_AVAILABLE = False
+
+try:
+    from src.core_modules import kabutack_kernels as _aot
+except ImportError:
+    _aot = None
+
+# 控制命令范围 (vx, vy, vyaw)
+CMD_HI = np.array([0.5, 0.3, 0.8])
+CMD_LO = -CMD_HI
+
+# 导出签名 (同时用于njit的导入时编译和pycc的AOT编译)
+_CC_CORE_SIG = "UniTuple(f8, 3)(f8, f8, f8, f8, f8, f8, f8)"
+_BBOX_SIG = "Tuple((f8, f8, f8, f8, i8))({}[:, :], f8, f8)"
+_IOU_SIG = "f8(f8, f8, f8, f8, f8, f8, f8, f8)"
+
+
+def _cc_core(x1, y1, x2, y2, fw, fh, speed):
+    """
+    根据目标边界框计算控制命令
+
+    Args:
+        x1, y1, x2, y2: 目标边界框
+        fw, fh: 图像宽高
+        speed: 跟踪速度系数
+
+    Returns:
+        控制命令 (vx, vy, vyaw)
+    """
+    half_w = fw * 0.5
+
+    # 目标中心相对图像中心的归一化水平偏移
+    norm_offset_x = ((x1 + x2) * 0.5 - half_w) / half_w
+
+    # 目标大小占比
+    size_ratio = ((x2 - x1) * (y2 - y1)) / (fw * fh)
+
+    # 水平偏移控制旋转
+    vyaw = -norm_offset_x * 0.5 * speed
+
+    # 前进速度基于目标大小
+    vx = 0.0
+    if size_ratio < 0.1:  # 目标太小，需要靠近
+        vx = 0.3 * speed
+    elif size_ratio > 0.3:  # 目标太大，需要后退
+        vx = -0.2 * speed
+
+    # 侧向移动基于水平偏移
+    vy = 0.0
+    if abs(norm_offset_x) > 0.3:
+        vy = norm_offset_x * 0.2 * speed
+
+    # 限制命令范围
+    vx = max(-0.5, min(0.5, vx))
+    vy = max(-0.3, min(0.3, vy))
+    vyaw = max(-0.8, min(0.8, vyaw))
+
+    return vx, vy, vyaw
+
+
+def _bbox_from_points(pts, w, h):
+    """
+    单次遍历跟踪点，计算图像范围内有效点的外接框
+
+    Args:
+        pts: 跟踪点 (N, 2)
+        w, h: 图像宽高
+
+    Returns:
+        (x_min, y_min, x_max, y_max, 有效点数)
+    """
+    x_min = y_min = 1e18
+    x_max = y_max = -1e18
+    n = 0
+    for i in range(pts.shape[0]):
+        x = pts[i, 0]
+        y = pts[i, 1]
+        if 0 <= x < w and 0 <= y < h:
+            x_min = min(x_min, x)
+            y_min = min(y_min, y)
+            x_max = max(x_max, x)
+            y_max = max(y_max, y)
+            n += 1
+    return x_min, y_min, x_max, y_max, n
+
+
+def _iou(ax1, ay1, ax2, ay2, bx1, by1, bx2, by2):
+    """两个边界框 [x1, y1, x2, y2] 的交并比"""
+    iw = max(0.0, min(ax2, bx2) - max(ax1, bx1))
+    ih = max(0.0, min(ay2, by2) - max(ay1, by1))
+    inter = iw * ih
+    union = (ax2 - ax1) * (ay2 - ay1) + (bx2 - bx1) * (by2 - by1) - inter
+    return inter / union if union > 0.0 else 0.0
+
+
+def _resize_normalize_chw(img, out, scale, shift):
+    """
+    单次遍历完成 双线性缩放 + 归一化 + HWC转CHW
+
+    Args:
+        img: 输入图像 (H, W, 3) uint8
+        out: 输出 (3, oh, ow) float32，out[c] = resize(img)[..., c] * scale[c] - shift[c]
+        scale: 各通道缩放系数 (1/255/std)
+        shift: 各通道偏移 (mean/std)
+    """
+    h, w = img.shape[0], img.shape[1]
+    oh, ow = out.shape[1], out.shape[2]
+    sy = h / oh
+    sx = w / ow
+    for y in prange(oh):
+        fy = min(max((y + 0.5) * sy - 0.5, 0.0), h - 1.0)
+        y0 = int(fy)
+        y1 = min(y0 + 1, h - 1)
+        wy = fy - y0
+        for x in range(ow):
+            fx = min(max((x + 0.5) * sx - 0.5, 0.0), w - 1.0)
+            x0 = int(fx)
+            x1 = min(x0 + 1, w - 1)
+            wx = fx - x0
+            for c in range(3):
+                top = img[y0, x0, c] * (1.0 - wx) + img[y0, x1, c] * wx
+                bottom = img[y1, x0, c] * (1.0 - wx) + img[y1, x1, c] * wx
+                out[c, y, x] = (top * (1.0 - wy) + bottom * wy) * scale[c] - shift[c]
+
+
+def _cc_core_numpy(x1, y1, x2, y2, fw, fh, speed):
+    """_cc_core的NumPy实现"""
+    half_w = fw * 0.5
+    norm_offset_x = ((x1 + x2) * 0.5 - half_w) / half_w
+    size_ratio = ((x2 - x1) * (y2 - y1)) / (fw * fh)
+
+    cmds = np.array([
+        0.3 * (size_ratio < 0.1) - 0.2 * (size_ratio > 0.3),
+        0.2 * norm_offset_x * (abs(norm_offset_x) > 0.3),
+        -0.5 * norm_offset_x,
+    ]) * speed
+    np.clip(cmds, CMD_LO, CMD_HI, out=cmds)
+
+    vx, vy, vyaw = cmds.tolist()
+    return vx, vy, vyaw
+
+
+def _bbox_from_points_numpy(pts, w, h):
+    """_bbox_from_points的NumPy实现"""
+    valid = pts[(pts[:, 0] >= 0) & (pts[:, 0] < w) & (pts[:, 1] >= 0) & (pts[:, 1] < h)]
+    if len(valid) == 0:
+        return 1e18, 1e18, -1e18, -1e18, 0
+    x_min, y_min = valid.min(axis=0).tolist()
+    x_max, y_max = valid.max(axis=0).tolist()
+    return x_min, y_min, x_max, y_max, len(valid)
+
+
+if _aot is not None:
+    KERNEL_BACKEND = "aot"
+    cc_core = _aot.cc_core
+    iou = _aot.iou
+
+    def bbox_from_points(pts, w, h):
+        if pts.dtype == np.float32:
+            return _aot.bbox_from_points_f4(pts, w, h)
+        return _aot.bbox_from_points_f8(np.asarray(pts, dtype=np.float64), w, h)
+
+elif NUMBA_AVAILABLE:
+    KERNEL_BACKEND = "jit"
+    # 声明签名的内核在导入时完成编译 (cache=True 时从磁盘缓存加载)
+    cc_core = njit(_CC_CORE_SIG, cache=True, fastmath=True, boundscheck=False)(_cc_core)
+    bbox_from_points = njit(cache=True)(_bbox_from_points)
+    iou = njit(_IOU_SIG, cache=True, fastmath=True)(_iou)
+
+else:
+    KERNEL_BACKEND = "numpy"
+    cc_core = _cc_core_numpy
+    bbox_from_points = _bbox_from_points_numpy
+    iou = _iou
+
+# 并行内核不参与AOT编译 (pycc不支持parallel)，安装了numba时总是使用JIT；
+# 没有numba时不提供 (为None)，调用方使用原有的预处理路径 (NumPy实现比PIL更慢且缩小时没有抗锯齿)
+if NUMBA_AVAILABLE:
+    resize_normalize_chw = njit(cache=True, parallel=True, fastmath=True)(_resize_normalize_chw)
+else:
+    resize_normalize_chw = None
+
+
+def build_aot() -> None:
+    """使用numba.pycc将内核编译为扩展模块 kabutack_kernels，输出到本目录"""
+    from numba.pycc import CC
+
+    cc = CC("kabutack_kernels")
+    cc.output_dir = os.path.dirname(os.path.abspath(__file__))
+    cc.export("cc_core", _CC_CORE_SIG)(_cc_core)
+    cc.export("bbox_from_points_f4", _BBOX_SIG.format("f4"))(_bbox_from_points)
+    cc.export("bbox_from_points_f8", _BBOX_SIG.format("f8"))(_bbox_from_points)
+    cc.export("iou", _IOU_SIG)(_iou)
+    cc.compile()
+
+
+if __name__ == '__main__':
+    build_aot()
@@ -1,3 +1,6 @@
+import math
+
+
 class PIDController:
     def __init__(self,
                  kp: float,
@@ -25,6 +28,12 @@ class PIDController:
         self.prev_err = 0.0      # Previous error (for derivative calculation)
         self.output_limits = output_limits  # Output constraints
         
+        # Precomputed constants so that update() needs no branches:
+        # derivative term is disabled via a zero inverse when dt <= 0,
+        # and missing limits become an unbounded (-inf, inf) range
+        self._inv_dt = 1.0 / dt if dt > 0 else 0.0
+        self._lo, self._hi = output_limits if output_limits is not None else (-math.inf, math.inf)
+        
     def update(self, err: float) -> float:
         """
         Calculate PID control output
@@ -32,30 +41,19 @@ class PIDController:
         :param err: Current error (setpoint - process variable)
         :return: Control output
         """
-        # 1. Proportional term calculation
-        proportional = self.kp * err
-        
-        # 2. Integral term calculation (with anti-windup logic)
-        # Calculate unrestricted integral first
+        # 1. Integral accumulation (unrestricted first, rolled back below on windup)
         self.integral_err += err * self.dt
-        integral = self.ki * self.integral_err
         
-        # 3. Derivative term calculation (noise reduction using current and previous error)
-        # Prevent division by zero (dt should be > 0 in practical applications)
-        derivative = self.kd * (err - self.prev_err) / self.dt if self.dt > 0 else 0.0
+        # 2. Proportional + integral + derivative terms
+        output = self.kp * err + self.ki * self.integral_err + self.kd * (err - self.prev_err) * self._inv_dt
         
-        # 4. Total output calculation
-        output = proportional + integral + derivative
+        # 3. Output limiting
+        output = min(max(output, self._lo), self._hi)
         
-        # 5. Output limiting and integral separation (anti-windup)
-        if self.output_limits is not None:
-            output_min, output_max = self.output_limits
-            # Constrain output within limits
-            output = max(min(output, output_max), output_min)
-            
-            # Integral separation: stop integral accumulation when output is saturated
-            if (output == output_max and err > 0) or (output == output_min and err < 0):
-                self.integral_err -= err * self.dt  # Rollback current integration
+        # 4. Integral separation (anti-windup): rollback current integration when the
+        #    output is saturated in the direction of the error (bool arithmetic, no branches)
+        windup = ((output == self._hi) & (err > 0)) | ((output == self._lo) & (err < 0))
+        self.integral_err -= windup * err * self.dt
         
         # Update previous error for next calculation
         self.prev_err = err
@@ -65,4 +63,4 @@ class PIDController:
     def reset(self):
         """Reset PID controller state (for restarting control process)"""
         self.integral_err = 0.0
-        self.prev_err = 0.0
\ No newline at end of file
+        self.prev_err = 0.0
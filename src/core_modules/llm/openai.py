@@ -1,6 +1,50 @@
-import base64
-from openai import OpenAI
 import os
+import sys
+import functools
+from openai import OpenAI, DefaultHttpxClient
+import httpx
+
+# SIMD加速的base64 (pybase64，未安装时为标准库实现)，直接输出str
+from src.utils.image import b64encode_as_string
+
+try:
+    import h2  # noqa: F401  httpx的HTTP/2支持依赖h2
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# 流式输出时每收到多少个分片刷新一次stdout
+STREAM_FLUSH_EVERY = 16
+
+# 图像文件头 (magic bytes) 到图像类型的映射
+IMAGE_SIGNATURES = (
+    (b"\xff\xd8\xff", "jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"GIF87a", "gif"),
+    (b"GIF89a", "gif"),
+    (b"BM", "bmp"),
+    (b"II*\x00", "tiff"),
+    (b"MM\x00*", "tiff"),
+)
+
+
+# 扩展名与图像类型不一致的情况
+IMAGE_TYPE_BY_EXT = {"jpe": "jpeg", "jpg": "jpeg", "tif": "tiff"}
+
+
+def detect_image_type(data: bytes, image_path: str) -> str:
+    """根据文件头识别图像类型，无法识别时使用扩展名"""
+    for signature, img_type in IMAGE_SIGNATURES:
+        if data.startswith(signature):
+            return img_type
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "webp"
+    if data[4:8] == b"ftyp" and data[8:12] in (b"heic", b"heix", b"mif1"):
+        return "heic"
+
+    img_type = os.path.splitext(image_path)[1][1:].lower()  # png, bmp, jpeg, png, webp, heic, tiff
+    return IMAGE_TYPE_BY_EXT.get(img_type, img_type)
+
 
 class OpenAIModel:
     def __init__(self, model: str, api_key: str, base_url: str):
@@ -14,7 +58,36 @@ class OpenAIModel:
             base_url (str): url
         """
         self.model = model
-        self.client = OpenAI(api_key=api_key, base_url=base_url)
+        
+        # 复用同一个HTTP连接池 (可用时启用HTTP/2)，跨调用保持TCP+TLS连接
+        self.client = OpenAI(
+            api_key=api_key,
+            base_url=base_url,
+            http_client=DefaultHttpxClient(
+                http2=HTTP2_AVAILABLE,
+                limits=httpx.Limits(max_keepalive_connections=8)
+            )
+        )
+        
+        # 图像data URI缓存，键为 (路径, 修改时间, 文件大小)，文件变化后自动失效
+        self._load_image = functools.lru_cache(maxsize=32)(self._encode_image)
+
+    @staticmethod
+    def _encode_image(image_path: str, mtime_ns: int, size: int) -> str:
+        """
+        读取图像并编码为base64 data URI
+
+        Args:
+            image_path (str): 图像路径
+            mtime_ns (int): 文件修改时间，仅用作缓存键
+            size (int): 文件大小，仅用作缓存键
+
+        Returns:
+            data URI字符串 (data:image/<type>;base64,...)
+        """
+        with open(image_path, "rb") as image_file:
+            data = image_file.read()
+        return f"data:image/{detect_image_type(data, image_path)};base64,{b64encode_as_string(data)}"
 
     def __call__(self, 
                  prompt: str, 
@@ -42,20 +115,14 @@ class OpenAIModel:
         
         # 如果提供了图像路径，添加图像内容
         if image_path and os.path.exists(image_path):
-            # for aliyun
-            img_type = image_path.split('.')[-1].lower() # png, bmp, jpeg, png, webp, heic, tiff
-            if img_type in ["jpe", "jpeg", "jpg"]:
-                img_type = "jpeg"
-
-            # encode image in base64
-            base64_image = None
-            with open(image_path, "rb") as image_file:
-                base64_image = base64.b64encode(image_file.read()).decode("utf-8")
+            # encode image as a base64 data URI (cached until the file changes)
+            stat = os.stat(image_path)
+            image_url = self._load_image(image_path, stat.st_mtime_ns, stat.st_size)
                 
             user_content.append({
                 "type": "image_url",
                 "image_url": {
-                    "url": f"data:image/{img_type};base64,{base64_image}"
+                    "url": image_url
                 }
             })
         
@@ -78,11 +145,18 @@ class OpenAIModel:
         if not stream:
             response = completion.choices[0].message.content
         else:
-            response = ""
+            # 收集分片后一次性拼接，输出走stdout缓冲并按批刷新
+            chunks = []
             for chunk in completion:
-                if chunk.choices[0].delta.content is None:
+                text = chunk.choices[0].delta.content
+                if text is None:
                     continue
-                print(chunk.choices[0].delta.content)
-                response += chunk.choices[0].delta.content
+                chunks.append(text)
+                sys.stdout.write(text)
+                if len(chunks) % STREAM_FLUSH_EVERY == 0:
+                    sys.stdout.flush()
+            sys.stdout.write("\n")
+            sys.stdout.flush()
+            response = "".join(chunks)
         
         return response
\ No newline at end of file
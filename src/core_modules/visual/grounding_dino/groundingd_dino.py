@@ -1,10 +1,32 @@
 import cv2
+import torch
 import numpy as np
 from typing import Union
 from PIL import Image
 
 import groundingdino.datasets.transforms as T
 from groundingdino.util.inference import load_model, predict, annotate
+from src.core_modules._jit_kernels import resize_normalize_chw
+
+# 预处理参数，与image_transform一致
+RESIZE_SIZE = 800
+RESIZE_MAX_SIZE = 1333
+NORM_MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+NORM_STD = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+
+
+def resized_shape(h: int, w: int, size: int = RESIZE_SIZE, max_size: int = RESIZE_MAX_SIZE):
+    """短边缩放到size且长边不超过max_size后的 (oh, ow)，与T.RandomResize一致"""
+    min_original_size = float(min(w, h))
+    max_original_size = float(max(w, h))
+    if max_original_size / min_original_size * size > max_size:
+        size = int(round(max_size * min_original_size / max_original_size))
+
+    if (w <= h and w == size) or (h <= w and h == size):
+        return h, w
+    if w < h:
+        return int(size * h / w), size
+    return size, int(size * w / h)
 
 class GroundingDINO:
     """
@@ -15,7 +37,7 @@ class GroundingDINO:
     def __init__(self, model_config_path: str,
                        model_checkpoint_path: str, 
                        bert_base_uncased_path: str = None,
-                       device: str = "cpu",
+                       device: str = None,
                        box_treshold = 0.35,
                        text_treshold = 0.25
                 ):
@@ -24,22 +46,31 @@ class GroundingDINO:
             model_config_path (str): model config path
             model_checkpoint_path (str): model checkpoint path
             bert_base_uncased_path (str, optional): local path of bert_base_uncased
-            device (str, optional): device. Defaults to "cpu".
+            device (str, optional): device. Defaults to "cuda" when available, otherwise "cpu".
             box_treshold (float, optional):  Defaults to 0.35.
             text_treshold (float, optional):  Defaults to 0.25.
         """
+        if device is None:
+            device = "cuda" if torch.cuda.is_available() else "cpu"
+        
+        # 加载后一次性放到推理设备上，predict中的model.to(device)不再产生拷贝
         self.model = load_model(model_config_path, model_checkpoint_path, bert_base_uncased_path, device)
-        self.device = device
-        self.box_treshold = box_treshold,
-        self.text_treshold = text_treshold
+        self.model.to(device)
+        self.device = torch.device(device)
+        self.box_treshold = float(box_treshold)
+        self.text_treshold = float(text_treshold)
 
         self.image_transform = T.Compose(
             [
-                T.RandomResize([800], max_size=1333),
+                T.RandomResize([RESIZE_SIZE], max_size=RESIZE_MAX_SIZE),
                 T.ToTensor(),
-                T.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225]),
+                T.Normalize(NORM_MEAN.tolist(), NORM_STD.tolist()),
             ]
         )
+        
+        # numpy图像的融合预处理参数 (安装了numba时使用): out = pixel * scale - shift
+        self._norm_scale = (1.0 / 255.0 / NORM_STD).astype(np.float32)
+        self._norm_shift = (NORM_MEAN / NORM_STD).astype(np.float32)
 
     def __call__(self, image: Union[str, np.ndarray], text_prompt: str):
         """
@@ -49,7 +80,9 @@ class GroundingDINO:
             text_prompt (str): prompt
 
         Returns:
-            raw_image (np.ndarray): The source image. 
+            raw_image (np.ndarray | PIL.Image): The source image, a PIL image for path inputs
+                (converted to np.ndarray only when annotating). Large JPEG files are decoded at
+                a reduced scale no smaller than the model input, boxes are normalized so they still apply. 
             boxes (tensor) : predicted grouned box (n, 4)
             logits (tensor) : prediction probilities (n, 1)
             phrases (list[str]): detected objects phrases
@@ -58,15 +91,30 @@ class GroundingDINO:
         # load image
         if isinstance(image, str):
             # 处理图像路径
-            image_source = Image.open(image).convert("RGB")
-            raw_image = np.asarray(image_source)
+            # 直接以PIL图像作为原图返回，标注时才转换为numpy数组，避免每次调用都拷贝一份全分辨率图像
+            image_source = Image.open(image)
+            
+            # JPEG在DCT阶段直接按1/2, 1/4, 1/8降采样解码，解码尺寸不小于模型输入尺寸 (非JPEG时无效果)
+            oh, ow = resized_shape(image_source.height, image_source.width)
+            image_source.draft("RGB", (ow, oh))
+            image_source = image_source.convert("RGB")
+            raw_image = image_source
             image_transformed, _ = self.image_transform(image_source, None)
             
         elif isinstance(image, np.ndarray):
-            # 处理 numpy 数组类型的图像
+            # 处理 numpy 数组类型的图像 (H, W, 3)
             raw_image = image
-            image_source = Image.fromarray(np.uint8(image))
-            image_transformed = self.image_transform(image_source)
+            if resize_normalize_chw is not None:
+                # 缩放、归一化和HWC转CHW在一次遍历中完成 (numba编译)，不经过PIL和中间张量
+                oh, ow = resized_shape(image.shape[0], image.shape[1])
+                image_chw = np.empty((3, oh, ow), dtype=np.float32)
+                resize_normalize_chw(np.ascontiguousarray(image, dtype=np.uint8), image_chw,
+                                     self._norm_scale, self._norm_shift)
+                image_transformed = torch.from_numpy(image_chw)
+            else:
+                # 没有numba时使用PIL预处理
+                image_source = Image.fromarray(np.uint8(image))
+                image_transformed, _ = self.image_transform(image_source, None)
         
         else:
             raise TypeError("不支持的图像类型。必须是 str, np.ndarray")
@@ -86,13 +134,13 @@ class GroundingDINO:
     def annotate(self, raw_image, boxes, logits, phrases, output: str):
         """
         Args:
-            raw_image (np.ndarray): The source image to be annotated.
+            raw_image (np.ndarray | PIL.Image): The source image to be annotated.
             boxes (tensor) : predicted grouned box (n, 4)
             logits (tensor) : prediction probilities (n, 1)
             phrases (list[str]): detected objects phrases
             output (str): the annotated image path to be saved
         """
-        annotated_frame = annotate(image_source=raw_image, boxes=boxes, logits=logits, phrases=phrases)
+        annotated_frame = annotate(image_source=np.asarray(raw_image), boxes=boxes, logits=logits, phrases=phrases)
         cv2.imwrite(output, annotated_frame)
 
 if __name__ == '__main__':
@@ -1,4 +1,5 @@
 import numpy as np
+import torch
 from ultralytics import SAM
 
 class SAM2:
@@ -7,32 +8,43 @@ class SAM2:
         ultralytics's document': https://docs.ultralytics.com/models/sam/#sam-prediction-example
     """
     def __init__(self, 
-                 sam_model:str
+                 sam_model:str,
+                 half: bool = None
                 ):
+        """
+        Args:
+            sam_model (str): model path
+            half (bool): FP16 inference, defaults to True when CUDA is available
+        """
         # Load a model
         self.model = SAM(sam_model)
         self.model_name = sam_model
+        self.half = torch.cuda.is_available() if half is None else half
 
         print("🚀: SAM2 is init")
 
 
-    def __call__(self, img: str | np.ndarray, bboxes: list):
+    def __call__(self, img: str | np.ndarray, bboxes: list, to_numpy: bool = True):
         """
         Args:
             img (str | np.ndarray): image
             bboxes (list): bounding box
+            to_numpy (bool): return a numpy array, otherwise keep the mask as a tensor on the model device
 
         Returns:
-            seg_mask: segmentation masks H x W
+            seg_mask: segmentation masks H x W (uint8, 0 or 255), None if nothing is segmented
         """
-        results = self.model.predict(img, bboxes=bboxes)
+        seg_mask = None
+        # ultralytics runs prediction under torch.inference_mode; half casts model and input to FP16
+        results = self.model.predict(img, bboxes=bboxes, half=self.half)
         if results:
             result = results[0]
             masks = result.masks
             if masks is not None:
-                # 获取第一个掩码（numpy数组，shape为[H, W]，布尔值）
-                seg_mask = masks.data[0].cpu().numpy().astype(np.uint8) * 255  # 转换为0-255的灰度图
-                return seg_mask
+                # 在设备上转换第一个掩码为0-255的uint8灰度图，只传输uint8数据
+                seg_mask = masks.data[0].to(torch.uint8).mul_(255)
+                if to_numpy:
+                    seg_mask = seg_mask.cpu().numpy()
             
         return seg_mask
 
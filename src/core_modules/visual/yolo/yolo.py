@@ -27,11 +27,12 @@ class YoloMultiTask:
             self.model = YOLO(yolo_model)
 
         self.task = task
+        self._world_prompt = None  # yolo world classes currently set on the model
 
         print("🚀: YOLO is init")
 
 
-    def __call__(self, img: str | np.ndarray, 
+    def __call__(self, img: str | np.ndarray | list, 
                        prompt: str = None, 
                        save: bool = False,
                        plot: bool = False
@@ -40,23 +41,50 @@ class YoloMultiTask:
         ref: https://docs.ultralytics.com/modes/predict/#inference-sources
 
         Args:
-            img (str | np.ndarray): image, could be a local file, a url, a np.ndarray object
+            img (str | np.ndarray | list): image, could be a local file, a url, a np.ndarray object,
+                or a list of them which is inferred as one batch
             prompt (str): text prompt for yolo world
+
+        Returns:
+            output dict of the image, or a list of output dicts when img is a list
         """
-        # Inference
-        if self.task == "world":
+        # Set yolo world classes only when the prompt changes (runs the text encoder)
+        if self.task == "world" and prompt != self._world_prompt:
             self.model.set_classes([prompt])
-            results = self.model(img)
-        else:
-            results = self.model(img)
+            self._world_prompt = prompt
+
+        # Inference, a list of images is forwarded as a single batch
+        results = self.model(img)
+
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S") if save else None
+        outputs = []
+        for i, result in enumerate(results):
+            outputs.append(self._process_result(result))
+
+            if save:
+                suffix = f"_{i}" if isinstance(img, list) else ""
+                result.save(f"src/result_{timestamp}{suffix}.jpg")  # save to disk
+                
+            if plot:
+                result.show()
+
+        return outputs if isinstance(img, list) else outputs[0]
 
-        result = results[0]
+    def _process_result(self, result) -> dict:
+        """
+        Args:
+            result: ultralytics Results of one image
+
+        Returns:
+            output dict of the task
+        """
         output = {}
 
         # Process results list
         if self.task in ["detect", "world"]:
             boxes_xyxy = result.boxes.xyxy  # top-left-x, top-left-y, bottom-right-x, bottom-right-y
-            names = [result.names[cls.item()] for cls in result.boxes.cls.int()]  # class name of each box
+            # class name of each box, class ids are copied to host once (no per-box .item() sync)
+            names = [result.names[cls] for cls in result.boxes.cls.int().tolist()]
             confs = result.boxes.conf  # confidence score of each box
 
             output = {
@@ -67,7 +95,7 @@ class YoloMultiTask:
         
         elif self.task == "cls":
             # Probs object for classification outputs
-            top5_names = [result.names[cls.item()] for cls in result.probs.top5] # names of the top 5 classes.
+            top5_names = [result.names[cls] for cls in result.probs.top5] # names of the top 5 classes, top5 is a list of int
             top5_probs = result.probs.top5conf # Confidences of the top 5 classes.
 
             output = {
@@ -88,11 +116,4 @@ class YoloMultiTask:
         else:
             raise ValueError(f"{self.task} is not in ['detect', 'cls', 'pose', 'obb', 'world'")
 
-        if save:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            result.save(f"src/result_{timestamp}.jpg")  # save to disk
-            
-        if plot:
-            result.show()
-
-        return output
\ No newline at end of file
+        return output
@@ -1,7 +1,8 @@
 import time
+import threading
 import cv2
 import numpy as np
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple
 
 # unitree sdk
 from unitree_sdk2py.core.channel import ChannelSubscriber, ChannelFactoryInitialize
@@ -9,15 +10,42 @@ from unitree_sdk2py.idl.unitree_go.msg.dds_ import LowState_
 from unitree_sdk2py.go2.video.video_client import VideoClient
 from unitree_sdk2py.go2.sport.sport_client import SportClient
 
-from src.utils.image import encode_opencv_to_base64
+from src.utils.image import encode_JPEG_bytes_to_base64, IMREAD_SCALE_FLAGS
 from src.hardware_interface.base import RobotInterface
 
+try:
+    # libjpeg-turbo (SIMD) JPEG解码，未安装时使用cv2.imdecode
+    from turbojpeg import TurboJPEG, TJPF_BGR, TJFLAG_FASTDCT, TJFLAG_FASTUPSAMPLE
+except ImportError:
+    TurboJPEG = None
+
 class Go2Robot(RobotInterface):
-    def __init__(self) -> None:
-        """初始化Go2机器人"""
+    def __init__(self, image_scale: int = 1, image_period: float = 0.1) -> None:
+        """
+        初始化Go2机器人
+        
+        Args:
+            image_scale: 前置摄像头图像解码缩小倍数 (1, 2, 4, 8)，在JPEG解码阶段直接降采样
+            image_period: 前置摄像头图像采集周期 (s)，0表示不限频率 (每次采集完成后立即采集下一帧)
+        """
+        if image_scale not in IMREAD_SCALE_FLAGS:
+            raise ValueError(f"不支持的图像缩小倍数: {image_scale}")
+        if image_period < 0:
+            raise ValueError(f"图像采集周期不能为负: {image_period}")
+        self.image_scale = image_scale
+        self._jpeg: Optional["TurboJPEG"] = None
+        
         self._running = False
         self.observation: Optional[Dict[str, Any]] = None
         self.low_state: Optional[LowState_] = None
+        self._observation_updated = threading.Event()
+        
+        # 图像采集线程 (与底层状态回调解耦，按固定频率采集、解码和编码图像)
+        self.image_period = image_period
+        self._image_thread: Optional[threading.Thread] = None
+        
+        # 可序列化观测的base64图像缓存 (observation, base64)，每个observation只编码一次
+        self._serialized: Tuple[Optional[Dict[str, Any]], Optional[str]] = (None, None)
         
         # Unitree SDK 组件
         self.sport_client: Optional[SportClient] = None
@@ -44,10 +72,21 @@ class Go2Robot(RobotInterface):
             self.image_client.SetTimeout(3.0)
             self.image_client.Init()
             
+            # 初始化TurboJPEG解码器 (找不到libturbojpeg时使用cv2)
+            if TurboJPEG is not None:
+                try:
+                    self._jpeg = TurboJPEG()
+                except Exception as e:
+                    print(f"TurboJPEG不可用，使用cv2解码图像: {e}")
+            
             # 初始化底层状态订阅
             self.lowstate_subscriber = ChannelSubscriber("rt/lowstate", LowState_)
             self.lowstate_subscriber.Init(self._low_state_message_handler, 10)
             
+            # 启动图像采集线程
+            self._image_thread = threading.Thread(target=self._image_capture_loop, daemon=True)
+            self._image_thread.start()
+            
             print("Go2Robot initialized successfully.")
             
         except Exception as e:
@@ -59,6 +98,9 @@ class Go2Robot(RobotInterface):
         """关闭机器人连接"""
         self._running = False
         
+        if self._image_thread and self._image_thread.is_alive():
+            self._image_thread.join(timeout=1.0)
+        
         # 清理资源
         if self.sport_client:
             try:
@@ -72,30 +114,46 @@ class Go2Robot(RobotInterface):
         print("Go2Robot shutdown completed.")
     
     def _low_state_message_handler(self, msg: LowState_) -> None:
-        """底层状态消息回调处理器"""
+        """底层状态消息回调处理器 (高频SDK回调，只保存最新状态，不做耗时操作)"""
         if not self._running:
             return
+        
+        # 更新状态
+        self.low_state = msg
+    
+    def _image_capture_loop(self) -> None:
+        """图像采集循环：按image_period采集前置摄像头图像并构建observation"""
+        # 以单调时钟为基准按固定周期采集，避免sleep误差累积
+        next_capture_time = time.monotonic()
+        
+        while self._running:
+            try:
+                # 获取当前图像 (原始JPEG数据和解码后的图像)
+                front_image_bytes = self._capture_front_image_bytes()
+                front_image = self._decode_front_image(front_image_bytes) if front_image_bytes else None
+                
+                # 构建observation (进程内直接使用解码后的图像，需要base64时调用get_observation_serializable)
+                self.observation = {
+                    "state": self.low_state,
+                    "front_image": front_image,
+                    "front_image_bytes": front_image_bytes,  # 原始JPEG数据，供网络传输直接发送
+                    "timestamp": time.time()
+                }
+                self._observation_updated.set()
+                
+            except Exception as e:
+                print(f"采集图像时出错: {e}")
             
-        try:
-            # 更新状态
-            self.low_state = msg
-            
-            # 获取当前图像
-            front_image = self._capture_front_image()
-            front_image_base64 = encode_opencv_to_base64(front_image) if front_image is not None else None
-            
-            # 构建observation
-            self.observation = {
-                "state": msg,
-                "front_image": front_image_base64,
-                "timestamp": time.time()
-            }
-            
-        except Exception as e:
-            print(f"处理状态消息时出错: {e}")
+            next_capture_time += self.image_period
+            delay = next_capture_time - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                # 采集落后时重新对齐，不连续补采
+                next_capture_time = time.monotonic()
     
-    def _capture_front_image(self) -> Optional[np.ndarray]:
-        """从前置摄像头捕获图像"""
+    def _capture_front_image_bytes(self) -> Optional[bytes]:
+        """从前置摄像头获取原始JPEG数据"""
         if not self.image_client:
             return None
             
@@ -106,16 +164,28 @@ class Go2Robot(RobotInterface):
                 print(f"获取图像样本错误. code:{code}")
                 return None
             
-            # 转换为numpy图像
-            image_data = np.frombuffer(bytes(data), dtype=np.uint8)
-            image = cv2.imdecode(image_data, cv2.IMREAD_COLOR)
-            
-            return image
+            return bytes(data)
             
         except Exception as e:
             print(f"捕获图像时出错: {e}")
             return None
     
+    def _decode_front_image(self, image_bytes: bytes) -> Optional[np.ndarray]:
+        """解码前置摄像头的JPEG数据"""
+        try:
+            if self._jpeg is not None:
+                return self._jpeg.decode(image_bytes, pixel_format=TJPF_BGR,
+                                         scaling_factor=(1, self.image_scale),
+                                         flags=TJFLAG_FASTDCT | TJFLAG_FASTUPSAMPLE)
+            
+            # 转换为numpy图像
+            image_data = np.frombuffer(image_bytes, dtype=np.uint8)
+            return cv2.imdecode(image_data, IMREAD_SCALE_FLAGS[self.image_scale])
+            
+        except Exception as e:
+            print(f"解码图像时出错: {e}")
+            return None
+    
     def move(self, vx: float, vy: float, vyaw: float) -> None:
         """发送运动指令"""
         if not self._running or not self.sport_client:
@@ -129,10 +199,47 @@ class Go2Robot(RobotInterface):
     
     def get_observation(self) -> Dict[str, Any]:
         """获取观测数据"""
-        if self.observation is None:
+        return self._build_observation(self.observation)
+    
+    def _build_observation(self, source: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """由一次读取的观测快照构造观测数据，避免多次读取self.observation时被采集线程替换"""
+        if source is None:
             return {
-                "state": None,
+                "state": self.low_state,
                 "front_image": None,
+                "front_image_bytes": None,
                 "timestamp": time.time()
             }
-        return self.observation.copy()
\ No newline at end of file
+        
+        # 图像按采集频率更新，状态总是使用最新的底层状态
+        observation = source.copy()
+        observation["state"] = self.low_state
+        return observation
+    
+    def get_observation_serializable(self) -> Dict[str, Any]:
+        """
+        获取可文本序列化的观测数据，front_image为原始JPEG数据的base64编码
+        (不重新编码图像，按需计算且每个observation只计算一次)
+        """
+        # 只读取一次观测快照，状态、时间戳和图像都来自同一帧
+        source = self.observation
+        observation = self._build_observation(source)
+        
+        if source is None or not source["front_image_bytes"]:
+            observation["front_image"] = None
+            return observation
+        
+        # 缓存的快照和编码结果作为一个元组整体替换，并发调用时不会错配
+        cached_source, image_b64 = self._serialized
+        if source is not cached_source:
+            image_b64 = encode_JPEG_bytes_to_base64(source["front_image_bytes"])
+            self._serialized = (source, image_b64)
+        observation["front_image"] = image_b64
+        return observation
+    
+    def wait_for_observation(self, timeout: Optional[float] = None) -> bool:
+        """阻塞等待新的观测数据，超时返回False"""
+        if not self._observation_updated.wait(timeout):
+            return False
+        self._observation_updated.clear()
+        return True
\ No newline at end of file
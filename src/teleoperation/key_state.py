@@ -0,0 +1,84 @@
+"""
+终端键盘模式的按键状态
+
+终端原始模式下只能收到按键字符和自动重复，收不到松开事件，按键松开只能靠超时判定：
+首次按下后要等过终端的自动重复延迟 (通常250~500ms) 才会收到重复字符，
+开始自动重复后字符间隔只有几十ms，超过release_timeout没有新输入即视为松开。
+"""
+
+# 键盘控制按键在按键掩码中的位
+KEY_BITS = {'w': 0, 's': 1, 'a': 2, 'd': 3, 'q': 4, 'e': 5}
+
+ESC = 27
+SPACE = 32
+
+
+class TerminalKeyState:
+    """由终端按键字符批次维护按键掩码"""
+
+    def __init__(self, repeat_delay: float = 0.6, release_timeout: float = 0.15):
+        """
+        Args:
+            repeat_delay: 首次按下后判定松开的时间 (s)，需要覆盖终端的自动重复延迟
+            release_timeout: 开始自动重复后判定松开的时间 (s)
+        """
+        self.repeat_delay_ns = int(repeat_delay * 1e9)
+        self.release_timeout_ns = int(release_timeout * 1e9)
+        self.key_mask = 0
+        self._last_key_time = 0
+        self._repeating = False
+
+    def feed(self, buf: bytes, now_ns: int) -> bool:
+        """
+        处理一次读出的按键字符
+
+        Args:
+            buf: 按键字符
+            now_ns: 当前时间 (time.monotonic_ns())
+
+        Returns:
+            收到ESC时返回False
+        """
+        if ESC in buf:
+            return False
+
+        if SPACE in buf:
+            # 立即停止，忽略同一批中空格之前的按键
+            self.key_mask = 0
+            self._repeating = False
+            buf = buf[buf.rindex(SPACE) + 1:]
+
+        batch_mask = 0
+        for b in buf:
+            bit = KEY_BITS.get(chr(b).lower())
+            if bit is not None:
+                batch_mask |= 1 << bit
+        if not batch_mask:
+            return True
+
+        if batch_mask & ~self.key_mask:
+            # 有新按下的按键：按键掩码只保留这一批的按键 (之前的按键已经松开或被替换)，
+            # 重新等待自动重复延迟
+            self.key_mask = batch_mask
+            self._repeating = False
+        else:
+            # 只有已按下的按键，说明按键在自动重复
+            self._repeating = True
+        self._last_key_time = now_ns
+        return True
+
+    def update(self, now_ns: int) -> int:
+        """
+        超时没有新的按键输入时视为按键已松开
+
+        Args:
+            now_ns: 当前时间 (time.monotonic_ns())
+
+        Returns:
+            当前按键掩码
+        """
+        timeout_ns = self.release_timeout_ns if self._repeating else self.repeat_delay_ns
+        if self.key_mask and now_ns - self._last_key_time > timeout_ns:
+            self.key_mask = 0
+            self._repeating = False
+        return self.key_mask
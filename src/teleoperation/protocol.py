@@ -0,0 +1,73 @@
+"""
+遥操作消息的帧格式
+
+命令消息 = 定长32字节小端 (vx, vy, vyaw, timestamp)，速度为float64，
+时间戳为客户端单调时钟的int64纳秒 (time.monotonic_ns())，只能与同一客户端的时间戳比较
+
+观测消息 = [4字节小端元数据长度][元数据 (MessagePack)][原始JPEG图像数据]
+
+元数据和图像放在同一帧中而不是ZMQ多帧消息，因为观测socket使用ZMQ_CONFLATE
+(只保留最新消息)，而CONFLATE不支持多帧消息。图像以原始JPEG字节发送，不经过base64。
+
+两端的socket在bind/connect前统一用configure_socket设置选项。
+"""
+import zmq
+import struct
+from typing import Tuple
+
+CMD_STRUCT = struct.Struct("<dddq")
+OBS_HEADER = struct.Struct("<I")
+
+# 观测socket的内核收发缓冲区大小，一帧JPEG图像可以一次写入/读出
+OBS_SOCKET_BUFFER = 1 << 20
+
+
+def configure_socket(socket: zmq.Socket, sndbuf: int = -1, rcvbuf: int = -1):
+    """
+    设置遥操作socket的通用选项，需要在bind/connect之前调用
+
+    Args:
+        socket: 命令或观测socket
+        sndbuf: 内核发送缓冲区大小，-1为系统默认
+        rcvbuf: 内核接收缓冲区大小，-1为系统默认
+    """
+    # 只保留最新消息
+    socket.setsockopt(zmq.CONFLATE, 1)
+    # 只向已建立的连接发送，不为尚未连上的对端缓存过期消息
+    socket.setsockopt(zmq.IMMEDIATE, 1)
+    # 关闭时直接丢弃未发送的消息，不阻塞退出
+    socket.setsockopt(zmq.LINGER, 0)
+    # TCP保活，及时发现断开的连接
+    socket.setsockopt(zmq.TCP_KEEPALIVE, 1)
+    socket.setsockopt(zmq.TCP_KEEPALIVE_IDLE, 30)
+    socket.setsockopt(zmq.SNDBUF, sndbuf)
+    socket.setsockopt(zmq.RCVBUF, rcvbuf)
+
+
+def pack_observation(meta: bytes, image: bytes = b"") -> bytes:
+    """
+    打包观测消息
+
+    Args:
+        meta: 序列化后的元数据
+        image: 原始JPEG图像数据，没有图像时为空
+
+    Returns:
+        观测消息
+    """
+    return b"".join((OBS_HEADER.pack(len(meta)), meta, image or b""))
+
+
+def unpack_observation(msg) -> Tuple[memoryview, memoryview]:
+    """
+    解包观测消息 (零拷贝，返回消息的内存视图)
+
+    Args:
+        msg: 观测消息 (bytes-like)
+
+    Returns:
+        (元数据, 原始JPEG图像数据)，没有图像时图像为空视图
+    """
+    view = memoryview(msg)
+    meta_end = OBS_HEADER.size + OBS_HEADER.unpack_from(view)[0]
+    return view[OBS_HEADER.size:meta_end], view[meta_end:]
@@ -1,14 +1,32 @@
+import os
 import sys
 import zmq
-import json
 import time
+import msgspec
 import threading
 import tty
-import select
 import termios
+import numpy as np
 import rerun as rr
-from typing import Dict, Any
-from src.utils.image import decode_image_from_b64
+from typing import Dict, Any, Callable, List
+from src.utils.image import decode_image_from_JPEG_bytes, IMREAD_SCALE_FLAGS
+from src.teleoperation.protocol import CMD_STRUCT, OBS_SOCKET_BUFFER, configure_socket, unpack_observation
+from src.teleoperation.key_state import KEY_BITS, TerminalKeyState
+
+try:
+    # 键盘事件钩子 (可选，Linux下需要root权限)，用于keyboard_hook模式
+    import keyboard
+except ImportError:
+    keyboard = None
+
+class ObservationSnapshot:
+    """最新观测数据快照，创建后不再修改，接收线程整体替换"""
+    __slots__ = ('observation', 'state')
+
+    def __init__(self, observation=None, state=None):
+        self.observation = observation
+        self.state = state
+
 
 class TeleoperationClient:
     """遥操作客户端基础类，提供核心的通信和数据处理功能"""
@@ -17,7 +35,8 @@ class TeleoperationClient:
                        cmd_port: int = 5555, 
                        obs_port: int = 5556,
                        enable_rerun_logging: bool = True,
-                       teleoperation_type: str = "keyboard"
+                       teleoperation_type: str = "keyboard",
+                       image_scale: int = 1
         ):
         """
         初始化遥操作客户端基础功能
@@ -27,34 +46,53 @@ class TeleoperationClient:
             cmd_port: 命令端口
             obs_port: 观测数据端口
             enable_rerun_logging: 是否启用rerun数据记录
+            teleoperation_type: 遥操作类型
+            image_scale: 图像解码缩小倍数 (1, 2, 4, 8)，显示窗口小于相机分辨率时可减少解码开销
         """
         self.server_address = remote_robot_ip
         self.cmd_port = cmd_port
         self.obs_port = obs_port
         self.enable_rerun_logging = enable_rerun_logging
+        if image_scale not in IMREAD_SCALE_FLAGS:
+            raise ValueError(f"不支持的图像缩小倍数: {image_scale}")
+        self.image_scale = image_scale
         
-        # ZMQ设置
-        self.context = zmq.Context()
+        # ZMQ设置 (进程内共享一个context)
+        self.context = zmq.Context.instance()
 
         # 发送命令socket
         self.cmd_socket = self.context.socket(zmq.PUSH)
-        self.cmd_socket.setsockopt(zmq.CONFLATE, 1)
+        configure_socket(self.cmd_socket)
         self.cmd_socket.bind(f"tcp://*:{self.cmd_port}")
         
         # 接收观测socket
         self.obs_socket = self.context.socket(zmq.PULL)
-        self.obs_socket.setsockopt(zmq.CONFLATE, 1)
+        configure_socket(self.obs_socket, rcvbuf=OBS_SOCKET_BUFFER)
         self.obs_socket.connect(f"tcp://{self.server_address}:{self.obs_port}")
         
-        # 数据缓存
-        self._latest_observation = None
-        self._latest_state = None
+        # 观测数据解码器 (MessagePack)
+        self._obs_decoder = msgspec.msgpack.Decoder()
+        
+        # 数据缓存：接收线程构建新快照后以单次属性赋值替换 (CPython中为原子操作)，
+        # 读取方直接取引用，无需加锁和拷贝
+        self._snapshot = ObservationSnapshot()
+        
+        # 图像解码与接收分离：接收线程只保存最新的原始JPEG数据，
+        # 有rerun记录或图像回调时唤醒解码线程立即解码，否则在get_latest_image时按需解码；
+        # _decoded_jpeg记录_latest_image对应的JPEG数据，两者不一致时说明有新图像未解码
+        self._latest_jpeg = None
+        self._decoded_jpeg = None
+        self._jpeg_event = threading.Event()
         self._latest_image = None
-        self._lock = threading.Lock()
+
+        # 数据回调 (状态回调在观测接收线程中调用，图像回调在解码线程中调用)
+        self._state_callbacks: List[Callable[[Dict[str, Any]], None]] = []
+        self._image_callbacks: List[Callable[[Any], None]] = []
         
         # 运行状态
         self._running = True
         self._obs_thread = None
+        self._decode_thread = None
 
         # 控制线程
         self._control_thread = None
@@ -62,6 +100,31 @@ class TeleoperationClient:
         self.teleoperation_type = teleoperation_type
         self.max_linear_speed = 0.5
         self.max_angular_speed = 0.5
+
+        # 命令去重：相同命令只按保活间隔重发
+        self.cmd_keepalive_interval = 0.5
+        self._last_cmd = None
+        self._last_cmd_time = 0  # 单调时钟 (ns)
+        
+        # termios键盘模式下按键松开的判定时间 (见TerminalKeyState)：
+        # 新按下按键后为key_repeat_delay (覆盖终端的自动重复延迟)，开始自动重复后为key_release_timeout
+        self.key_repeat_delay = 0.6
+        self.key_release_timeout = 0.15
+
+        # 键盘事件钩子模式的按键状态 (由钩子回调更新，按下/松开时唤醒控制线程)
+        self._key_mask = 0
+        self._key_event = threading.Event()
+        
+        # rerun记录用的预分配数组，每帧原地写入，避免重复构造列表和推断dtype
+        self._pos_arr = np.zeros((1, 3), dtype=np.float32)
+        self._pos_colors = np.array([[0, 255, 0]], dtype=np.uint8)
+        
+        # 轨迹环形缓冲区，保留最近trajectory_length个位置
+        self.trajectory_length = 256
+        self._traj = np.zeros((self.trajectory_length, 3), dtype=np.float32)
+        self._traj_colors = np.tile(self._pos_colors, (self.trajectory_length, 1))
+        self._traj_idx = 0
+        self._traj_count = 0
     
     def initialize(self):
         """初始化连接和控制线程"""
@@ -72,19 +135,29 @@ class TeleoperationClient:
                 rr.log("description", rr.TextDocument("Teleoperation Client Data Visualization", 
                                                      media_type=rr.MediaType.MARKDOWN))
             
-            # 启动观测数据接收线程
-            self._obs_thread = threading.Thread(target=self._obs_receive_loop, daemon=True)
-            self._obs_thread.start()
+            # 启动图像解码线程
+            self._decode_thread = threading.Thread(target=self._image_decode_loop, daemon=True)
+            self._decode_thread.start()
             
             # 根据遥操作类型启动相应的控制线程
             if self.teleoperation_type == "keyboard":
                 self._control_thread = threading.Thread(target=self._keyboard_control_loop, daemon=True)
                 print("使用键盘控制模式")
+            elif self.teleoperation_type == "keyboard_hook":
+                if keyboard is None:
+                    raise ImportError("keyboard_hook模式需要安装keyboard: pip install keyboard")
+                self._control_thread = threading.Thread(target=self._keyboard_hook_loop, daemon=True)
+                print("使用键盘事件钩子控制模式")
             elif self.teleoperation_type == "gamepad":
                 raise NotImplementedError("not implemented")
             else:
                 raise ValueError(f"不支持的遥操作类型: {self.teleoperation_type}")
             
+            # 启动观测数据接收线程 (keyboard模式下由控制线程在同一个循环中接收)
+            if self.teleoperation_type != "keyboard":
+                self._obs_thread = threading.Thread(target=self._obs_receive_loop, daemon=True)
+                self._obs_thread.start()
+            
             self._control_thread.start()
             print(f"已连接到机器人服务器: {self.server_address}")
             
@@ -104,10 +177,12 @@ class TeleoperationClient:
         if self._obs_thread and self._obs_thread.is_alive():
             self._obs_thread.join(timeout=2.0)
         
+        if self._decode_thread and self._decode_thread.is_alive():
+            self._decode_thread.join(timeout=1.0)
+        
         # 关闭socket
         self.cmd_socket.close()
         self.obs_socket.close()
-        self.context.term()
         
         print("Disconnected from teleoperation server")
     
@@ -117,11 +192,18 @@ class TeleoperationClient:
             return
             
         try:
-            # 记录位置信息
-            if 'position' in state_data:
-                pos = state_data['position']
-                if isinstance(pos, (list, tuple)) and len(pos) >= 3:
-                    rr.log("robot/position", rr.Points3D([pos[:3]], colors=[0, 255, 0]))
+            # 记录位置信息 (列表、元组或numpy数组均可，直接写入预分配数组)
+            pos = state_data.get('position')
+            if pos is not None and len(pos) >= 3:
+                self._pos_arr[0] = pos[:3]
+                rr.log("robot/position", rr.Points3D(self._pos_arr, colors=self._pos_colors))
+                
+                # 写入轨迹环形缓冲区，缓冲区写满前只记录已写入的部分
+                self._traj[self._traj_idx] = self._pos_arr[0]
+                self._traj_idx = (self._traj_idx + 1) % self.trajectory_length
+                self._traj_count = min(self._traj_count + 1, self.trajectory_length)
+                n = self._traj_count
+                rr.log("robot/trajectory", rr.Points3D(self._traj[:n], colors=self._traj_colors[:n]))
 
         except Exception as e:
             print(f"Failed to log state to rerun: {e}")
@@ -130,40 +212,85 @@ class TeleoperationClient:
         """观测数据接收循环"""
         while self._running:
             try:
-                # 接收观测数据
-                json_msg = self.obs_socket.recv_string(flags=zmq.NOBLOCK)
-                observation = json.loads(json_msg)
+                # 阻塞等待观测数据 (超时后检查运行状态)
+                if not self.obs_socket.poll(timeout=100, flags=zmq.POLLIN):
+                    continue
                 
-                with self._lock:
-                    self._latest_observation = observation
-                    
-                    # 解析状态数据
-                    if 'state' in observation and observation['state']:
-                        self._latest_state = observation['state']
-                        # 记录状态数据到rerun
-                        if self.enable_rerun_logging:
-                            self._log_state_to_rerun(observation['state'])
-                    
-                    # 解析图像数据
-                    if 'front_image' in observation and observation['front_image']:
-                        try:
-                            image = decode_image_from_b64(observation['front_image'])
-                            if image is not None:
-                                self._latest_image = image
-                                # 记录图像数据到rerun
-                                if self.enable_rerun_logging:
-                                    rr.log("camera/front_image", rr.Image(image))
-                        except Exception as e:
-                            print(f"Failed to decode image: {e}")
+                self._receive_observation()
                     
             except zmq.Again:
                 # 没有消息可接收
-                time.sleep(0.01)
+                pass
             except Exception as e:
                 print(f"Observation receive error: {e}")
                 time.sleep(0.1)
     
-    def _send_move_command(self, vx: float, vy: float, vyaw: float):
+    def _receive_observation(self):
+        """接收并处理一条观测数据 (非阻塞，没有消息时抛出zmq.Again)"""
+        # 接收观测数据 (zmq.Frame，零拷贝)
+        msg = self.obs_socket.recv(flags=zmq.NOBLOCK, copy=False)
+        meta, image_bytes = unpack_observation(msg.buffer)
+        observation = self._obs_decoder.decode(meta)
+        
+        state = observation.get('state')
+        
+        # 图像数据 (原始JPEG数据) 只保存不解码，视图保持zmq.Frame存活
+        if image_bytes:
+            self._latest_jpeg = image_bytes
+            if self.enable_rerun_logging or self._image_callbacks:
+                self._jpeg_event.set()
+        
+        # 没有新状态时沿用上一快照中的状态
+        self._snapshot = ObservationSnapshot(observation, state if state else self._snapshot.state)
+        
+        # 解析状态数据
+        if state:
+            # 记录状态数据到rerun
+            if self.enable_rerun_logging:
+                self._log_state_to_rerun(state)
+            for callback in self._state_callbacks:
+                callback(state)
+    
+    def _image_decode_loop(self):
+        """图像解码循环：解码最新的JPEG数据，解码期间到达的旧帧被新帧覆盖"""
+        while self._running:
+            # 等待新图像 (超时后检查运行状态)
+            if not self._jpeg_event.wait(timeout=0.1):
+                continue
+            self._jpeg_event.clear()
+            
+            try:
+                image = self._decode_latest_image()
+                if image is None:
+                    continue
+                
+                # 记录图像数据到rerun
+                if self.enable_rerun_logging:
+                    rr.log("camera/front_image", rr.Image(image, color_model="BGR"))
+                for callback in self._image_callbacks:
+                    callback(image)
+            
+            except Exception as e:
+                print(f"Failed to decode image: {e}")
+    
+    def _decode_latest_image(self):
+        """
+        解码最新收到的JPEG数据并更新_latest_image
+        
+        Returns:
+            新解码的图像，没有新图像时返回None
+        """
+        jpeg = self._latest_jpeg
+        if jpeg is None or jpeg is self._decoded_jpeg:
+            return None
+        image = decode_image_from_JPEG_bytes(jpeg, self.image_scale)
+        if image is not None:
+            # 先发布图像再更新标记，读取方看到标记一致时图像一定是最新的
+            self._latest_image = image
+            self._decoded_jpeg = jpeg
+        return image
+    
+    def _send_move_command(self, vx: float, vy: float, vyaw: float, ts_ns: int = None, force: bool = False):
         """
         发送运动命令
         
@@ -171,17 +298,19 @@ class TeleoperationClient:
             vx: 前进速度 (m/s)
             vy: 侧向速度 (m/s)
             vyaw: 角速度 (rad/s)
+            ts_ns: 命令时间戳 (time.monotonic_ns())，控制循环每个周期取一次后传入，为None时在此获取
+            force: 跳过去重立即发送 (用于退出控制时的停止命令)
         """
+        if ts_ns is None:
+            ts_ns = time.monotonic_ns()
+        cmd = (round(vx, 3), round(vy, 3), round(vyaw, 3))
+        if not force and cmd == self._last_cmd and ts_ns - self._last_cmd_time < self.cmd_keepalive_interval * 1e9:
+            return
+        
         try:
-            cmd_data = {
-                'vx': float(vx),
-                'vy': float(vy),
-                'vyaw': float(vyaw),
-                'timestamp': time.time()
-            }
-            
-            json_msg = json.dumps(cmd_data)
-            self.cmd_socket.send_string(json_msg, flags=zmq.NOBLOCK)
+            self.cmd_socket.send(CMD_STRUCT.pack(vx, vy, vyaw, ts_ns), flags=zmq.NOBLOCK)
+            self._last_cmd = cmd
+            self._last_cmd_time = ts_ns
             
         except Exception as e:
             print(f"Failed to send move command: {e}")
@@ -190,86 +319,170 @@ class TeleoperationClient:
         """检查是否已连接"""
         return self._running
     
+    def on_state(self, callback: Callable[[Dict[str, Any]], None]):
+        """
+        注册状态数据回调，每收到新的状态数据时在接收线程中调用，无需轮询get_latest_state
+        
+        Args:
+            callback: 回调函数，参数为状态数据
+        """
+        self._state_callbacks.append(callback)
+    
+    def on_image(self, callback: Callable[[Any], None]):
+        """
+        注册图像数据回调，每解码出新的图像时在解码线程中调用，无需轮询get_latest_image
+        
+        Args:
+            callback: 回调函数，参数为解码后的图像
+        """
+        self._image_callbacks.append(callback)
+    
     def get_latest_observation(self) -> Dict[str, Any]:
-        """获取最新的观测数据"""
-        with self._lock:
-            return self._latest_observation
+        """获取最新的观测数据 (共享引用，不要修改)"""
+        return self._snapshot.observation
     
     def get_latest_state(self) -> Dict[str, Any]:
-        """获取最新的状态数据"""
-        with self._lock:
-            return self._latest_state
+        """
+        获取最新的状态数据 (共享引用，不要修改)
+        
+        状态以MessagePack传输，机器人SDK的状态对象 (dataclass，如Go2的LowState_) 解码为
+        按字段名嵌套的字典/列表 (旧的JSON格式中为str(msg)字符串)，无法序列化的字段为字符串
+        """
+        return self._snapshot.state
     
     def get_latest_image(self):
-        """获取最新的图像数据"""
-        with self._lock:
-            return self._latest_image
+        """获取最新的图像数据 (共享引用，需要修改时请先copy())，有未解码的新图像时在此解码"""
+        try:
+            self._decode_latest_image()
+        except Exception as e:
+            print(f"Failed to decode image: {e}")
+        return self._latest_image
 
+    def _calculate_velocities(self, key_mask: int):
+        """
+        根据按键掩码计算速度，成对按键 (W/S, A/D, Q/E) 的位相减得到方向
+        
+        Args:
+            key_mask: 按键掩码，位定义见KEY_BITS
+        
+        Returns:
+            (vx, vy, vyaw)
+        """
+        vx = self.max_linear_speed * ((key_mask & 1) - ((key_mask >> 1) & 1))
+        vy = self.max_linear_speed * (((key_mask >> 2) & 1) - ((key_mask >> 3) & 1))
+        vyaw = self.max_angular_speed * (((key_mask >> 4) & 1) - ((key_mask >> 5) & 1))
+        return vx, vy, vyaw
+    
     def _keyboard_control_loop(self):
-        """键盘控制循环 - 使用termios实现"""
-        # 保存原始终端设置
-        old_settings = termios.tcgetattr(sys.stdin)
+        """
+        键盘控制循环 - 使用termios实现
+        
+        标准输入和观测socket注册到同一个zmq.Poller，在一个循环中读取按键并接收观测数据；
+        ESC退出键盘控制或键盘控制出错 (如标准输入不是终端) 后发送停止命令，并继续接收观测数据
+        """
+        old_settings = None
         
         try:
-            # 设置终端为原始模式
+            # 保存原始终端设置，设置终端为原始模式
+            old_settings = termios.tcgetattr(sys.stdin)
             tty.setraw(sys.stdin.fileno())
             
             print("Keyboard control active. Press keys to control:")
             print("W/S: Forward/Backward, A/D: Left/Right, Q/E: Turn Left/Right, Space: Stop, ESC: Quit")
             print("Press and hold keys for continuous movement...")
             
-            # 按键状态跟踪
-            pressed_keys = set()
+            # 按键状态跟踪 (按键掩码，超时判定松开)
+            key_state = TerminalKeyState(self.key_repeat_delay, self.key_release_timeout)
+            fd = sys.stdin.fileno()
+            poller = zmq.Poller()
+            poller.register(self.obs_socket, zmq.POLLIN)
+            poller.register(fd, zmq.POLLIN)
+            poll_timeout = int(self.key_release_timeout * 1000 / 3)
             
             while self._control_running:
-                # 检查是否有输入可用
-                if select.select([sys.stdin], [], [], 0.01)[0]:
-                    key = sys.stdin.read(1)
-                    
-                    # 处理特殊键
-                    if ord(key) == 27:  # ESC键
-                        break
-                    elif ord(key) == 32:  # 空格键
-                        # 立即停止
-                        self._send_move_command(0.0, 0.0, 0.0)
-                        pressed_keys.clear()
-                        continue
-                    elif key.lower() in 'wasdqe':
-                        pressed_keys.add(key.lower())
+                # 阻塞等待按键输入或观测数据，超时后检查按键是否已松开
+                events = dict(poller.poll(poll_timeout))
+                # 每个周期只取一次时间，按键判定和命令时间戳共用
+                now_ns = time.monotonic_ns()
                 
-                # 计算当前速度
-                vx = 0.0
-                vy = 0.0
-                vyaw = 0.0
-
-                if 'w' in pressed_keys:
-                    vx = self.max_linear_speed
-                elif 's' in pressed_keys:
-                    vx = -self.max_linear_speed
+                if self.obs_socket in events:
+                    try:
+                        self._receive_observation()
+                    except zmq.Again:
+                        pass
+                    except Exception as e:
+                        print(f"Observation receive error: {e}")
                 
-                if 'a' in pressed_keys:
-                    vy = self.max_linear_speed
-                elif 'd' in pressed_keys:
-                    vy = -self.max_linear_speed
-                
-                if 'q' in pressed_keys:
-                    vyaw = self.max_angular_speed
-                elif 'e' in pressed_keys:
-                    vyaw = -self.max_angular_speed
-
-                # 发送命令
-                self._send_move_command(vx, vy, vyaw)
+                if fd in events:
+                    # 一次读出所有待处理的按键 (自动重复会积压多个字符)，ESC退出
+                    if not key_state.feed(os.read(fd, 64), now_ns):
+                        break
                 
-                # 清除按键状态（因为termios不能持续检测按键状态）
-                pressed_keys.clear()
+                # 超时没有新的按键输入视为按键已松开
+                # (termios不能持续检测按键状态，按住时靠自动重复刷新)
+                key_mask = key_state.update(now_ns)
                 
-                # 控制循环频率
-                time.sleep(0.1)
+                # 计算当前速度并发送命令 (相同命令只按保活间隔重发)
+                self._send_move_command(*self._calculate_velocities(key_mask), now_ns)
                 
         except KeyboardInterrupt:
             print("\nKeyboard control interrupted")
+        
+        except Exception as e:
+            print(f"Keyboard control error: {e}")
 
         finally:
             # 恢复原始终端设置
-            termios.tcsetattr(sys.stdin, termios.TCSADRAIN, old_settings)
-            print("\nKeyboard control stopped") 
\ No newline at end of file
+            if old_settings is not None:
+                termios.tcsetattr(sys.stdin, termios.TCSADRAIN, old_settings)
+            print("\nKeyboard control stopped") 
+        
+        # 停止机器人 (跳过去重，确保最后一个运动命令不会一直生效)
+        self._send_move_command(0.0, 0.0, 0.0, force=True)
+        
+        # 退出键盘控制后继续接收观测数据
+        self._obs_receive_loop()
+
+    def _on_key_event(self, event):
+        """
+        键盘钩子回调 (在keyboard库的线程中调用)，只更新按键状态并唤醒控制线程，
+        命令统一由控制线程发送 (ZMQ socket不是线程安全的)
+        
+        Args:
+            event: keyboard.KeyboardEvent
+        """
+        name = (event.name or "").lower()
+        pressed = event.event_type == keyboard.KEY_DOWN
+        
+        if name == "esc" and pressed:
+            self._control_running = False
+        elif name == "space" and pressed:
+            # 立即停止
+            self._key_mask = 0
+        elif name in KEY_BITS:
+            bit = 1 << KEY_BITS[name]
+            self._key_mask = (self._key_mask | bit) if pressed else (self._key_mask & ~bit)
+        else:
+            return
+        
+        self._key_event.set()
+    
+    def _keyboard_hook_loop(self):
+        """键盘控制循环 - 使用键盘事件钩子，按键按下/松开时立即发送命令"""
+        keyboard.hook(self._on_key_event)
+        
+        print("Keyboard control active. Press keys to control:")
+        print("W/S: Forward/Backward, A/D: Left/Right, Q/E: Turn Left/Right, Space: Stop, ESC: Quit")
+        
+        try:
+            while self._control_running:
+                # 按键状态变化时立即发送；无变化时按保活间隔重发当前命令
+                self._send_move_command(*self._calculate_velocities(self._key_mask))
+                self._key_event.wait(timeout=self.cmd_keepalive_interval)
+                self._key_event.clear()
+            
+            self._send_move_command(0.0, 0.0, 0.0, force=True)
+        
+        finally:
+            keyboard.unhook(self._on_key_event)
+            print("\nKeyboard control stopped")
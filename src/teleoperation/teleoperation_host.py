@@ -1,27 +1,36 @@
 import zmq
-import json
 import time
+import msgspec
 import threading
 
 from src.hardware_interface.base import RobotInterface
+from src.teleoperation.protocol import CMD_STRUCT, OBS_SOCKET_BUFFER, configure_socket, pack_observation
 
 class TeleoperationServer:
-    def __init__(self, robot: RobotInterface, client_ip: str, cmd_port=5555, obs_port=5556):
+    def __init__(self, robot: RobotInterface, client_ip: str, cmd_port=5555, obs_port=5556, verbose=False):
         self.robot = robot
+        self.verbose = verbose  # 是否打印每条收到的命令
         self.running = True
         self.cmd_port = cmd_port
         self.obs_port = obs_port
         
-        # ZMQ设置
-        self.cmd_context = zmq.Context()
-        self.cmd_socket = self.cmd_context.socket(zmq.PULL)
-        self.cmd_socket.setsockopt(zmq.CONFLATE, 1)
+        # ZMQ设置 (进程内共享一个context)
+        self.context = zmq.Context.instance()
+        
+        self.cmd_socket = self.context.socket(zmq.PULL)
+        configure_socket(self.cmd_socket)
         self.cmd_socket.connect(f"tcp://{client_ip}:{cmd_port}")
         
-        self.obs_context = zmq.Context()
-        self.obs_socket = self.obs_context.socket(zmq.PUSH)
-        self.obs_socket.setsockopt(zmq.CONFLATE, 1)
+        self.obs_socket = self.context.socket(zmq.PUSH)
+        configure_socket(self.obs_socket, sndbuf=OBS_SOCKET_BUFFER)
         self.obs_socket.bind(f"tcp://*:{obs_port}")
+
+        # 观测发布周期 (10Hz)
+        self.obs_publish_period = 0.1
+
+        # 观测数据编码器 (MessagePack)。dataclass (如Unitree SDK的LowState_) 编码为嵌套的map，
+        # 客户端收到的state是字典而不是旧JSON格式下的str(msg)；其余无法序列化的对象转为字符串
+        self._obs_encoder = msgspec.msgpack.Encoder(enc_hook=str)
     
     def start(self):
         # 启动命令监听线程
@@ -43,13 +52,13 @@ class TeleoperationServer:
     def _cmd_listen_loop(self):
         while self.running:
             try:
-                json_msg = self.cmd_socket.recv_string(flags=zmq.NOBLOCK)
-                print(f"Received command: {json_msg}")
-                cmd_data = json.loads(json_msg)
-                
-                vx = float(cmd_data.get('vx', 0.0))
-                vy = float(cmd_data.get('vy', 0.0))
-                vyaw = float(cmd_data.get('vyaw', 0.0))
+                # 阻塞等待命令 (超时后检查运行状态)
+                if not self.cmd_socket.poll(timeout=100, flags=zmq.POLLIN):
+                    continue
+                msg = self.cmd_socket.recv(flags=zmq.NOBLOCK)
+                vx, vy, vyaw, ts_ns = CMD_STRUCT.unpack(msg)
+                if self.verbose:
+                    print(f"Received command: vx={vx}, vy={vy}, vyaw={vyaw}, ts_ns={ts_ns}")
                 
                 self.robot.move(vx, vy, vyaw)
                 
@@ -59,21 +68,33 @@ class TeleoperationServer:
                 print(f"Command processing error: {e}")
     
     def _obs_publish_loop(self):
+        # 以单调时钟为基准按固定周期发布，避免sleep误差累积
+        next_publish_time = time.monotonic()
+        
         while self.running:
             try:
                 observation = self.robot.get_observation()
-                json_msg = json.dumps(observation, default=str)  # 添加default=str处理序列化
-                self.obs_socket.send_string(json_msg, flags=zmq.NOBLOCK)
-                time.sleep(0.1)  # 10Hz发布频率
+                
+                # 图像以原始JPEG数据单独打包，元数据中不再携带base64图像
+                image = observation.get('front_image_bytes')
+                meta = {k: v for k, v in observation.items() if k not in ('front_image', 'front_image_bytes')}
+                msg = pack_observation(self._obs_encoder.encode(meta), image)
+                self.obs_socket.send(msg, flags=zmq.NOBLOCK)
             except Exception as e:
                 print(f"Observation publishing error: {e}")
+            
+            next_publish_time += self.obs_publish_period
+            delay = next_publish_time - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                # 发布落后时重新对齐，不连续补发
+                next_publish_time = time.monotonic()
     
     def stop(self):
         self.running = False
         self.cmd_socket.close()
         self.obs_socket.close()
-        self.cmd_context.term()
-        self.obs_context.term()
 
 def load_robot(robot_type: str):
     """动态加载机器人实例"""
@@ -1,27 +1,49 @@
-import base64
 import logging
 import cv2
 import numpy as np
 from typing import Optional
 
-def encode_opencv_to_base64(image_data):
-    # 将图像编码为JPEG格式的字节数据
-    _, image_encoded = cv2.imencode('.jpg', image_data)
-    image_bytes = image_encoded.tobytes()
+try:
+    # SIMD (SSE/AVX2/AVX-512/NEON) 加速的base64，接口与标准库一致
+    import pybase64 as base64
+    from pybase64 import b64encode_as_string
+except ImportError:
+    import base64
 
-    # base64 编码
-    image_bytes_base64 = base64.b64encode(image_bytes).decode("utf-8")
+    def b64encode_as_string(data) -> str:
+        return base64.b64encode(data).decode("ascii")
+
+# 解码缩放倍数到imdecode标志的映射，REDUCED模式在libjpeg的DCT阶段直接降采样，
+# 比全分辨率解码后再resize快得多
+IMREAD_SCALE_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+
+def encode_opencv_to_base64(image_data, quality: int = 95):
+    # 将图像编码为JPEG格式的字节数据 (默认质量95与OpenCV默认一致)
+    _, image_encoded = cv2.imencode('.jpg', image_data, [cv2.IMWRITE_JPEG_QUALITY, quality])
+
+    # base64 编码 (直接读取编码结果的缓冲区并输出str，不经过中间bytes)
+    image_bytes_base64 = b64encode_as_string(image_encoded)
 
     return image_bytes_base64
 
-def decode_image_from_b64(image_b64: str) -> Optional[np.ndarray]:
-    """Decodes a base64 encoded image string to an OpenCV image."""
+def encode_JPEG_bytes_to_base64(image_data: bytes) -> str:
+    """Encodes raw JPEG image data to a base64 string without re-encoding the image."""
+    return b64encode_as_string(image_data)
+
+def decode_image_from_b64(image_b64: str, scale: int = 1) -> Optional[np.ndarray]:
+    """Decodes a base64 encoded image string to an OpenCV image, downscaled by `scale` (1, 2, 4 or 8)."""
     if not image_b64:
         return None
     try:
-        jpg_data = base64.b64decode(image_b64)
+        jpg_data = base64.b64decode(image_b64, validate=False)
         np_arr = np.frombuffer(jpg_data, dtype=np.uint8)
-        frame = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
+        frame = cv2.imdecode(np_arr, IMREAD_SCALE_FLAGS[scale])
         if frame is None:
             logging.warning("cv2.imdecode returned None for an image.")
         return frame
@@ -29,13 +51,14 @@ def decode_image_from_b64(image_b64: str) -> Optional[np.ndarray]:
         logging.error(f"Error decoding base64 image data: {e}")
         return None
 
-def decode_image_from_JPEG_bytes(image_data: bytes) -> Optional[np.ndarray]:
-    """Decodes JPEG image data from bytes to an OpenCV image."""
+def decode_image_from_JPEG_bytes(image_data: bytes, scale: int = 1) -> Optional[np.ndarray]:
+    """Decodes JPEG image data from bytes to an OpenCV image, downscaled by `scale` (1, 2, 4 or 8)."""
     if not image_data:
         return None
     try:
+        # cv2.imdecode只接受ndarray (不接受bytes/memoryview)，np.frombuffer是零拷贝视图
         np_arr = np.frombuffer(image_data, dtype=np.uint8)
-        frame = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
+        frame = cv2.imdecode(np_arr, IMREAD_SCALE_FLAGS[scale])
         if frame is None:
             logging.warning("cv2.imdecode returned None for an image.")
         return frame
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("PIL")
+pytest.importorskip("groundingdino")
+
+from src.core_modules.visual.grounding_dino import groundingd_dino
+
+
+class FakeModel:
+    def to(self, device):
+        return self
+
+
+@pytest.fixture
+def fake_predict(monkeypatch):
+    """替换load_model/predict，predict记录调用参数并按阈值过滤固定的检测结果"""
+    calls = []
+    boxes = torch.tensor([[0.5, 0.5, 0.1, 0.1], [0.5, 0.5, 0.2, 0.2], [0.5, 0.5, 0.3, 0.3]])
+    logits = torch.tensor([0.30, 0.40, 0.60])
+    phrases = ["a", "b", "c"]
+
+    def predict(model, image, caption, box_threshold, text_threshold, device):
+        calls.append({"box_threshold": box_threshold, "text_threshold": text_threshold})
+        keep = logits > box_threshold
+        return boxes[keep], logits[keep], [p for p, k in zip(phrases, keep.tolist()) if k]
+
+    monkeypatch.setattr(groundingd_dino, "load_model", lambda *args, **kwargs: FakeModel())
+    monkeypatch.setattr(groundingd_dino, "predict", predict)
+    return calls
+
+
+def test_thresholds_passed_as_floats(fake_predict):
+    detector = groundingd_dino.GroundingDINO("config.py", "checkpoint.pth", device="cpu",
+                                             box_treshold="0.35", text_treshold=0.25)
+    detector(np.zeros((32, 48, 3), dtype=np.uint8), "a cup")
+
+    assert fake_predict[0] == {"box_threshold": 0.35, "text_threshold": 0.25}
+    assert all(type(v) is float for v in fake_predict[0].values())
+
+
+@pytest.mark.parametrize("box_threshold, expected", [(0.35, ["b", "c"]), (0.5, ["c"]), (0.7, [])])
+def test_box_threshold_filters(fake_predict, box_threshold, expected):
+    detector = groundingd_dino.GroundingDINO("config.py", "checkpoint.pth", device="cpu",
+                                             box_treshold=box_threshold)
+    _, boxes, logits, phrases = detector(np.zeros((32, 48, 3), dtype=np.uint8), "a cup")
+
+    assert phrases == expected
+    assert len(boxes) == len(logits) == len(expected)
@@ -0,0 +1,81 @@
+from src.teleoperation.key_state import KEY_BITS, TerminalKeyState
+
+MS = 1_000_000
+
+
+def mask(keys):
+    m = 0
+    for k in keys:
+        m |= 1 << KEY_BITS[k]
+    return m
+
+
+def hold(state, key, start_ms, end_ms, repeat_ms=33):
+    """模拟终端自动重复：按下后等待自动重复延迟 (500ms)，之后每repeat_ms收到一个字符"""
+    state.feed(key, start_ms * MS)
+    t = start_ms + 500
+    while t <= end_ms:
+        state.feed(key, t * MS)
+        t += repeat_ms
+    return t - repeat_ms
+
+
+def test_held_key_survives_autorepeat_delay():
+    state = TerminalKeyState()
+    state.feed(b'w', 0)
+    # 自动重复开始前不能判定为松开
+    assert state.update(499 * MS) == mask('w')
+    last = hold(state, b'w', 0, 1000)
+    assert state.update((last + 100) * MS) == mask('w')
+    # 开始自动重复后，超过release_timeout没有输入即松开
+    assert state.update((last + 151) * MS) == 0
+
+
+def test_single_tap_released_after_repeat_delay():
+    state = TerminalKeyState()
+    state.feed(b'a', 0)
+    assert state.update(600 * MS) == mask('a')
+    assert state.update(601 * MS) == 0
+
+
+def test_switch_to_new_key_replaces_mask_and_waits_repeat_delay():
+    state = TerminalKeyState()
+    last = hold(state, b'w', 0, 1000)
+    # W松开后按下A：掩码只保留A，并重新等待自动重复延迟，不会先斜行再停下
+    state.feed(b'a', (last + 20) * MS)
+    for t in range(last + 20, last + 520, 10):
+        assert state.update(t * MS) == mask('a')
+    hold(state, b'a', last + 20, last + 1000)
+    assert state.update((last + 1000) * MS) == mask('a')
+
+
+def test_opposite_key_does_not_cancel():
+    state = TerminalKeyState()
+    last = hold(state, b'w', 0, 1000)
+    state.feed(b's', (last + 20) * MS)
+    assert state.update((last + 300) * MS) == mask('s')
+
+
+def test_repeat_of_held_key_subset_keeps_mask():
+    state = TerminalKeyState()
+    state.feed(b'wa', 0)
+    # 终端只重复最后按下的按键
+    state.feed(b'a', 500 * MS)
+    assert state.update(600 * MS) == mask('wa')
+    assert state.update(651 * MS) == 0
+
+
+def test_space_and_esc():
+    state = TerminalKeyState()
+    state.feed(b'w', 0)
+    # 空格停止，同一批中空格之后的按键仍然生效
+    state.feed(b'w d', 10 * MS)
+    assert state.update(20 * MS) == mask('d')
+    state.feed(b'd ', 30 * MS)
+    assert state.update(40 * MS) == 0
+    state.feed(b'q', 50 * MS)
+    assert state.update(60 * MS) == mask('q')
+    assert state.feed(b'\x1b', 70 * MS) is False
+    # 无关字符不刷新按键
+    state.feed(b'x', 600 * MS)
+    assert state.update(651 * MS) == 0
@@ -1,11 +1,14 @@
 import zmq
-import json
 import time
+import struct
+
+# 命令消息格式，与src/teleoperation/protocol.py中的CMD_STRUCT一致 (vx, vy, vyaw, ts_ns)
+CMD_STRUCT = struct.Struct("<dddq")
 
 def cmd_receiver():
     """测试ZMQ客户端，接收teleoperation_client发送的命令"""
-    # 创建上下文
-    context = zmq.Context()
+    # 使用进程内共享的上下文
+    context = zmq.Context.instance()
     
     # 创建PULL socket用于接收命令
     socket = context.socket(zmq.PULL)
@@ -21,21 +24,21 @@ def cmd_receiver():
         while True:
             try:
                 # 非阻塞接收消息
-                json_msg = socket.recv_string(flags=zmq.NOBLOCK)
+                msg = socket.recv(flags=zmq.NOBLOCK)
                 
-                # 解析JSON命令
+                # 解析二进制命令 (vx, vy, vyaw, ts_ns)
                 try:
-                    cmd_data = json.loads(json_msg)
+                    vx, vy, vyaw, ts_ns = CMD_STRUCT.unpack(msg)
                     print(f"\n收到命令:")
-                    print(f"  vx (前进速度): {cmd_data.get('vx', 0.0)} m/s")
-                    print(f"  vy (侧向速度): {cmd_data.get('vy', 0.0)} m/s")
-                    print(f"  vyaw (角速度): {cmd_data.get('vyaw', 0.0)} rad/s")
-                    print(f"  时间戳: {cmd_data.get('timestamp', 'N/A')}")
-                    print(f"  原始JSON: {json_msg}")
+                    print(f"  vx (前进速度): {vx} m/s")
+                    print(f"  vy (侧向速度): {vy} m/s")
+                    print(f"  vyaw (角速度): {vyaw} rad/s")
+                    print(f"  时间戳 (客户端单调时钟ns): {ts_ns}")
+                    print(f"  原始数据: {msg.hex()}")
                     
-                except json.JSONDecodeError as e:
-                    print(f"JSON解析错误: {e}")
-                    print(f"原始消息: {json_msg}")
+                except struct.error as e:
+                    print(f"命令解析错误: {e}")
+                    print(f"原始消息: {msg!r}")
                     
             except zmq.Again:
                 # 没有消息可接收，短暂等待
@@ -44,9 +47,8 @@ def cmd_receiver():
     except KeyboardInterrupt:
         print("\n接收器被用户中断")
     finally:
-        # 关闭套接字和上下文
-        socket.close()
-        context.term()
+        # 只关闭套接字，共享上下文随进程退出
+        socket.close(linger=0)
         print("接收器已关闭")
 
 if __name__ == "__main__":
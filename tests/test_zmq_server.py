@@ -2,8 +2,8 @@ import zmq
 import time
 
 def sender():
-    # 创建上下文
-    context = zmq.Context()
+    # 使用进程内共享的上下文
+    context = zmq.Context.instance()
     
     # 创建一个PUSH类型的套接字（用于发送消息）
     socket = context.socket(zmq.PUSH)
@@ -22,9 +22,8 @@ def sender():
     except KeyboardInterrupt:
         print("\n发送者被用户中断")
     finally:
-        # 关闭套接字和上下文
-        socket.close()
-        context.term()
+        # 只关闭套接字，共享上下文随进程退出
+        socket.close(linger=0)
 
 if __name__ == "__main__":
     sender()
\ No newline at end of file